@@ -1,13 +1,17 @@
 import os
 import logging
-from flask import Flask, render_template, request, send_file, flash, redirect, url_for, jsonify, session
+import secrets
+from flask import Flask, render_template, request, send_file, flash, redirect, url_for, jsonify, session, abort
 from werkzeug.utils import secure_filename
 from werkzeug.middleware.proxy_fix import ProxyFix
-import zipfile
-import csv
 import io
-import tempfile
-from card_generator import CardGenerator
+from card_generator import CardGenerator, normalize_card_data
+from encoders import encoder_stats
+from archive import ARCHIVE_FORMATS
+from artifact_store import get_artifact_store
+from batch import CsvSource, make_job_id
+from card_store import create_card_store
+from render_pool import create_render_client
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -30,6 +34,35 @@ app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(EXPORT_FOLDER, exist_ok=True)
 
+# Server-side card store; the session only carries the card id. The default
+# SQLite file is shared by every worker on the host and survives reloads, so
+# an export can be served by a different process than the one that rendered
+# the preview. Stored cards expire after CARD_STORE_MAX_AGE seconds and the
+# oldest are dropped beyond CARD_STORE_MAX_CARDS. Set CARD_STORE_URL to an
+# empty string for a memory-only store.
+card_store = create_card_store(os.environ.get("CARD_STORE_URL", f"sqlite:///{EXPORT_FOLDER}/card_store.db"),
+                               capacity=int(os.environ.get("CARD_STORE_SIZE", "128")),
+                               max_cards=int(os.environ.get("CARD_STORE_MAX_CARDS", "10000")),
+                               max_age=int(os.environ.get("CARD_STORE_MAX_AGE", str(7 * 24 * 3600))))
+
+# Optional shared render pool; when unset cards render in the web worker
+render_pool = create_render_client()
+
+# Encoder profile per endpoint (see encoders.ENCODER_PROFILES)
+PREVIEW_PROFILE = os.environ.get('PREVIEW_ENCODER', 'fast')
+BATCH_PROFILE = os.environ.get('BATCH_ENCODER', 'compact')
+GALLERY_PROFILE = os.environ.get('GALLERY_ENCODER', 'webp')
+
+EXPORT_TYPES = {
+    'png': ('image/png', 'business_card.png'),
+    'jpg': ('image/jpeg', 'business_card.jpg'),
+    'webp': ('image/webp', 'business_card.webp'),
+    'pdf': ('application/pdf', 'business_card.pdf'),
+    'pdf_print': ('application/pdf', 'business_card_print.pdf'),
+    'html': ('text/html', 'business_card.html'),
+    'vcf': ('text/vcard', 'business_card.vcf'),
+}
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
@@ -39,7 +72,12 @@ def index():
     templates = CardGenerator.get_available_templates()
     fonts = CardGenerator.get_available_fonts()
     colors = CardGenerator.get_available_colors()
-    return render_template('index.html', templates=templates, fonts=fonts, colors=colors)
+    return render_template('index.html', templates=templates, fonts=fonts, colors=colors,
+                           gallery=template_gallery()[1])
+
+def template_gallery():
+    """Return the gallery sprite's key and its tile map with the sprite URL"""
+    return CardGenerator().template_gallery(GALLERY_PROFILE)
 
 @app.route('/preview', methods=['POST'])
 def preview():
@@ -56,7 +94,7 @@ def preview():
                 if social_value:
                     social_media[value] = social_value
         
-        card_data = {
+        card_data = normalize_card_data({
             'name': request.form.get('name', ''),
             'job_title': request.form.get('job_title', ''),
             'company': request.form.get('company', ''),
@@ -69,8 +107,9 @@ def preview():
             'font': request.form.get('font', 'Arial'),
             'color': request.form.get('color', 'blue'),
             'text_align': request.form.get('text_align', 'left'),
+            'text_fit': request.form.get('text_fit', 'wrap'),
             'include_qr': request.form.get('include_qr') == 'on'
-        }
+        })
         
         # Handle logo upload
         logo_file = None
@@ -83,11 +122,21 @@ def preview():
                 logo_file = logo_path
         
         generator = CardGenerator()
-        preview_path = generator.generate_preview(card_data, logo_file)
+        key = generator.export_key(card_data, 'preview', logo_file, PREVIEW_PROFILE)
+        img = None
+        if not render_pool and key not in generator.artifact_store:
+            img = generator.create_card_image(card_data, logo_file)
+        preview_data = generator.cached_export(card_data, 'preview', logo_file, img=img, profile=PREVIEW_PROFILE,
+                                               renderer=render_pool, key=key)
+        preview_path = generator.save_preview(preview_data, PREVIEW_PROFILE, key)
         
-        # Store card data in session for export
-        session['card_data'] = card_data
-        session['logo_file'] = logo_file
+        # Keep card data and the rendered image server-side for export
+        card_id = card_store.put(card_data, logo_file)
+        if img is not None:
+            card_store.put_artifact(card_id, 'image', img)
+        session.pop('card_data', None)
+        session.pop('logo_file', None)
+        session['card_id'] = card_id
         
         return render_template('preview.html', 
                              card_data=card_data, 
@@ -103,102 +152,173 @@ def preview():
 def export_card(format):
     """Export business card in specified format"""
     try:
-        # Get card data from session
-        card_data = session.get('card_data', {})
-        logo_file = session.get('logo_file', None)
-        
-        if not card_data:
-            flash('No card data found. Please create a card first.', 'error')
-            return redirect(url_for('index'))
-        
-        generator = CardGenerator()
+        # Look up the card referenced by the session
+        card_id = session.get('card_id')
+        entry = card_store.get(card_id)
         
-        if format == 'png':
-            file_path = generator.generate_png(card_data, logo_file)
-            return send_file(file_path, as_attachment=True, download_name='business_card.png')
+        if not entry:
+            return error_redirect('No card data found. Please create a card first.', 'index')
         
-        elif format == 'pdf':
-            file_path = generator.generate_pdf(card_data, logo_file)
-            return send_file(file_path, as_attachment=True, download_name='business_card.pdf')
+        if format not in EXPORT_TYPES:
+            return error_redirect('Invalid export format', 'index')
         
-        elif format == 'pdf_print':
-            file_path = generator.generate_print_pdf(card_data, logo_file)
-            return send_file(file_path, as_attachment=True, download_name='business_card_print.pdf')
+        data = CardGenerator().cached_export(entry['card_data'], format, entry['logo_file'],
+                                             img=card_store.get_artifact(card_id, 'image'), renderer=render_pool)
         
-        elif format == 'html':
-            file_path = generator.generate_animated_html(card_data, logo_file)
-            return send_file(file_path, as_attachment=True, download_name='business_card.html')
-        
-        else:
-            flash('Invalid export format', 'error')
-            return redirect(url_for('index'))
+        mimetype, download_name = EXPORT_TYPES[format]
+        return send_file(io.BytesIO(data), mimetype=mimetype, as_attachment=True,
+                         download_name=download_name)
     
     except Exception as e:
         logging.error(f"Error in export: {str(e)}")
-        flash(f'Error exporting card: {str(e)}', 'error')
-        return redirect(url_for('index'))
+        return error_redirect(f'Error exporting card: {str(e)}', 'index')
 
 @app.route('/batch')
 def batch():
     """Batch processing page"""
     return render_template('batch.html')
 
+class BatchUploadError(ValueError):
+    """Invalid batch upload; the message is shown to the user"""
+
+def batch_owner():
+    """Random id scoping this browser's batch series, kept in the session"""
+    if 'batch_owner' not in session:
+        session['batch_owner'] = secrets.token_hex(16)
+        session.permanent = True
+    return session['batch_owner']
+
+def read_batch_upload(req, owner=None):
+    """Validate a batch upload request and return the lazily parsed CSV rows and batch settings.
+
+    ``owner`` (see ``batch_owner``) scopes the named batch series, so
+    uploads are only compared with the same browser's earlier uploads.
+    """
+    if 'csv_file' not in req.files:
+        raise BatchUploadError('No file uploaded')
+    
+    file = req.files['csv_file']
+    if file.filename == '':
+        raise BatchUploadError('No file selected')
+    
+    if not file.filename or not file.filename.lower().endswith('.csv'):
+        raise BatchUploadError('Please upload a CSV file')
+    
+    # Read CSV data; undecodable bytes are kept as surrogates so the rows
+    # they appear in are reported as errors instead of failing the upload
+    raw = file.stream.read()
+    csv_data = CsvSource(raw.decode('utf-8-sig', errors='surrogateescape'))
+    
+    if next(iter(csv_data), None) is None:
+        raise BatchUploadError('CSV file is empty or invalid')
+    
+    # Get batch settings
+    settings = {
+        'template': req.form.get('batch_template', 'modern'),
+        'font': req.form.get('batch_font', 'Arial'),
+        'color': req.form.get('batch_color', 'blue'),
+        'export_format': req.form.get('batch_format', 'png'),
+        'archive_format': req.form.get('batch_archive', 'zip'),
+        'delta': req.form.get('batch_mode') == 'delta',
+    }
+    if settings['archive_format'] not in ARCHIVE_FORMATS:
+        raise BatchUploadError('Invalid archive format')
+    series = req.form.get('batch_series', '').strip()[:100]
+    if series and not owner:
+        raise BatchUploadError('Batch series need a session')
+    settings['series'] = f"{owner}/{series}" if series else None
+    if settings['delta'] and not settings['series']:
+        raise BatchUploadError('Name the batch series to compare this upload with its last batch')
+    # Uploading the same file with the same settings resumes an interrupted run
+    settings['job_id'] = make_job_id(raw, dict(settings, profile=BATCH_PROFILE))
+    return csv_data, settings
+
+def batch_summary_headers(summary):
+    """Response headers reporting a finished batch's row counts"""
+    return [(f'X-Batch-{key.capitalize()}', str(summary[key]))
+            for key in ('rows', 'deduplicated', 'failed', 'rendered')]
+
+def error_redirect(message, endpoint):
+    """Flash an error and redirect to ``endpoint``; needs a request context"""
+    flash(message, 'error')
+    return redirect(url_for(endpoint))
+
 @app.route('/batch/upload', methods=['POST'])
 def batch_upload():
     """Handle CSV upload for batch processing"""
     try:
-        if 'csv_file' not in request.files:
-            flash('No file uploaded', 'error')
-            return redirect(url_for('batch'))
-        
-        file = request.files['csv_file']
-        if file.filename == '':
-            flash('No file selected', 'error')
-            return redirect(url_for('batch'))
-        
-        if not file.filename or not file.filename.lower().endswith('.csv'):
-            flash('Please upload a CSV file', 'error')
-            return redirect(url_for('batch'))
-        
-        # Read CSV data
-        csv_data = []
-        stream = io.StringIO(file.stream.read().decode("UTF8"), newline=None)
-        csv_reader = csv.DictReader(stream)
-        
-        for row in csv_reader:
-            csv_data.append(row)
-        
-        if not csv_data:
-            flash('CSV file is empty or invalid', 'error')
-            return redirect(url_for('batch'))
-        
-        # Get batch settings
-        template = request.form.get('batch_template', 'modern')
-        font = request.form.get('batch_font', 'Arial')
-        color = request.form.get('batch_color', 'blue')
-        export_format = request.form.get('batch_format', 'png')
+        try:
+            csv_data, settings = read_batch_upload(request, batch_owner())
+        except BatchUploadError as e:
+            return error_redirect(str(e), 'batch')
         
         # Generate batch cards
         generator = CardGenerator()
-        zip_path = generator.generate_batch(csv_data, template, font, color, export_format)
+        zip_path = generator.generate_batch(csv_data, image_profile=BATCH_PROFILE, **settings)
         
-        return send_file(zip_path, as_attachment=True, download_name='business_cards_batch.zip')
+        extension, mimetype = ARCHIVE_FORMATS[settings['archive_format']]
+        response = send_file(zip_path, mimetype=mimetype, as_attachment=True,
+                             download_name=f'business_cards_batch.{extension}')
+        response.headers.extend(batch_summary_headers(generator.last_batch_summary))
+        return response
     
     except Exception as e:
         logging.error(f"Error in batch upload: {str(e)}")
-        flash(f'Error processing batch: {str(e)}', 'error')
-        return redirect(url_for('batch'))
+        return error_redirect(f'Error processing batch: {str(e)}', 'batch')
 
 @app.route('/api/preview', methods=['POST'])
 def api_preview():
     """AJAX endpoint for real-time preview updates"""
     try:
-        card_data = request.json
+        card_data = normalize_card_data(request.json or {})
         generator = CardGenerator()
-        preview_path = generator.generate_preview(card_data)
+        key = generator.export_key(card_data, 'preview', profile=PREVIEW_PROFILE)
+        preview_data = generator.cached_export(card_data, 'preview', profile=PREVIEW_PROFILE,
+                                               renderer=render_pool, key=key)
+        preview_path = generator.save_preview(preview_data, PREVIEW_PROFILE, key)
         return jsonify({'success': True, 'preview_url': preview_path})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
+@app.route('/api/gallery')
+def api_gallery():
+    """Sprite sheet URL and tile offsets of every template and color scheme.
+
+    The map only changes with the template registry, so clients revalidate
+    it by ETag; the sprite itself is served immutable from ``/previews``.
+    """
+    key, gallery = template_gallery()
+    response = jsonify(gallery)
+    response.set_etag(key)
+    response.headers['Cache-Control'] = 'public, max-age=3600'
+    return response.make_conditional(request)
+
+@app.route('/previews/<name>')
+def preview_image(name):
+    """Serve a preview image from the artifact store; previews are
+    content-addressed so they can be cached indefinitely"""
+    preview = CardGenerator().get_preview(name)
+    if preview is None:
+        abort(404)
+    data, mimetype = preview
+    response = app.response_class(bytes(data), mimetype=mimetype)
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+@app.route('/api/metrics')
+def api_metrics():
+    """Encoder profiles per endpoint and encode statistics for this worker"""
+    return jsonify({
+        'endpoint_profiles': {
+            'preview': PREVIEW_PROFILE,
+            'export_png': 'print',
+            'export_jpg': 'jpeg',
+            'export_webp': 'webp',
+            'batch': BATCH_PROFILE,
+        },
+        'encoders': encoder_stats(),
+        'artifact_store': get_artifact_store().stats(),
+    })
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,116 @@
+"""Archive writers for batch outputs.
+
+Entries are stored or deflated per file type: PNG, JPEG, WebP and PDF output
+is already compressed, so it is stored as-is and zip time stays negligible
+for image batches, while HTML is deflated. A streamed tar format is available
+as an alternative to zip. Local runs can also write the entries as plain files
+into a directory.
+"""
+import os
+import io
+import time
+import uuid
+import tarfile
+import zipfile
+
+# Extensions whose contents are already compressed
+STORED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'webp', 'gif', 'pdf', 'zip', 'gz'}
+
+ARCHIVE_FORMATS = {
+    'zip': ('zip', 'application/zip'),
+    'tar': ('tar', 'application/x-tar'),
+    'tar.gz': ('tar.gz', 'application/gzip'),
+}
+
+# Entries written as files into a directory; only for local output, so it is
+# not one of the downloadable ARCHIVE_FORMATS
+DIRECTORY = 'dir'
+
+
+def is_precompressed(name):
+    return name.rsplit('.', 1)[-1].lower() in STORED_EXTENSIONS
+
+
+class ArchiveWriter:
+    """Write named byte entries into a zip or tar archive, or a directory.
+
+    Entries appear in the archive in the order they were added.
+    """
+
+    def __init__(self, path, archive_format='zip', compresslevel=6):
+        if archive_format not in ARCHIVE_FORMATS and archive_format != DIRECTORY:
+            raise ValueError(f"Unsupported archive format: {archive_format}")
+        self.path = path
+        self.archive_format = archive_format
+        self.compresslevel = compresslevel
+        self._tar = None
+        self._zip = None
+        if archive_format == DIRECTORY:
+            os.makedirs(path, exist_ok=True)
+        elif archive_format == 'zip':
+            self._zip = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED, compresslevel=compresslevel)
+        else:
+            # Stream mode never seeks, so the archive can be written to pipes too
+            mode = 'w|gz' if archive_format == 'tar.gz' else 'w|'
+            self._tar = tarfile.open(path, mode)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def add(self, name, data):
+        """Add an entry; already-compressed formats are stored, others deflated"""
+        if self.archive_format == DIRECTORY:
+            with open(self._file_path(name), 'wb') as f:
+                f.write(data)
+        elif self._tar is not None:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            info.mode = 0o644
+            self._tar.addfile(info, io.BytesIO(data))
+        elif is_precompressed(name):
+            self._zip.writestr(name, data, compress_type=zipfile.ZIP_STORED)
+        else:
+            self._zip.writestr(name, data, compress_type=zipfile.ZIP_DEFLATED)
+
+    def add_reference(self, name, target, data):
+        """Add an entry with the same contents ``data`` as the earlier entry ``target``.
+
+        Tar archives and directories get a hard link. Zip has no links, so
+        ``data`` is added again; duplicates are mostly PNG or PDF cards, which
+        are stored without compressing.
+        """
+        if self.archive_format == DIRECTORY:
+            path = self._file_path(name)
+            if os.path.lexists(path):
+                os.remove(path)
+            os.link(self._file_path(target), path)
+            return
+        if self._tar is not None:
+            info = tarfile.TarInfo(name)
+            info.type = tarfile.LNKTYPE
+            info.linkname = target
+            info.mtime = int(time.time())
+            info.mode = 0o644
+            self._tar.addfile(info)
+            return
+        self.add(name, data)
+
+    def _file_path(self, name):
+        # Entry names come from CSV values; keep them inside the directory
+        return os.path.join(self.path, name.replace(os.sep, '_'))
+
+    def close(self):
+        if self._zip is not None:
+            self._zip.close()
+        if self._tar is not None:
+            self._tar.close()
+
+
+def archive_path(directory, prefix, archive_format):
+    """Return a unique archive path with the extension for ``archive_format``"""
+    extension = ARCHIVE_FORMATS[archive_format][0]
+    return os.path.join(directory, f"{prefix}_{uuid.uuid4().hex}.{extension}")
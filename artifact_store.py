@@ -0,0 +1,236 @@
+"""Persistent artifact store for rendered cards.
+
+Rendered bytes (PNG, PDF, HTML, previews) are appended to segment files under
+``path`` and found through an in-memory index keyed by content hash, rebuilt
+from the record headers when a process first uses the store. Reads return
+``memoryview`` slices of a read-only ``mmap`` of the segment, so a hit is
+paged in by the OS rather than read into a buffer; callers that need ``bytes``
+copy the slice.
+
+Segments are sealed at ``segment_size``. When the store grows past
+``max_bytes`` it is compacted: the oldest segments are dropped, and artifacts
+read since the last compaction are first carried forward into the newest
+segment. Artifacts pinned by a running batch are never dropped; segments
+holding them are kept until the batch unpins them. Pins are per process.
+Several processes can share one store; writes and compaction happen
+under an exclusive file lock, and a process picks up other processes' writes
+by rescanning segment tails when a lookup misses.
+"""
+import os
+import mmap
+import fcntl
+import struct
+import logging
+import threading
+from contextlib import contextmanager
+
+DEFAULT_PATH = os.path.join('exports', 'artifacts')
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+DEFAULT_SEGMENT_SIZE = 64 * 1024 * 1024
+
+# Record header: magic, key length, data length; followed by the key and data
+_HEADER = struct.Struct('<4sHI')
+_MAGIC = b'CRD1'
+
+
+class ArtifactStore:
+    """Append-only segment files with an index keyed by content hash"""
+
+    def __init__(self, path=None, max_bytes=None, segment_size=DEFAULT_SEGMENT_SIZE):
+        self.path = path or os.environ.get('ARTIFACT_STORE_PATH', DEFAULT_PATH)
+        self.max_bytes = max_bytes or int(os.environ.get('ARTIFACT_STORE_MAX_BYTES', DEFAULT_MAX_BYTES))
+        self.segment_size = segment_size
+        self._index = {}  # key -> (segment id, data offset, data length)
+        self._scanned = {}  # segment id -> end of the last complete record
+        self._maps = {}
+        self._recent = set()
+        self._pins = []  # sets of pinned keys, one per pin() caller
+        self._compact_at = 0  # total size that triggers the next compaction
+        self._lock = threading.RLock()
+
+    def __reduce__(self):
+        # Generators sent to worker processes use that process's store for the same path
+        return get_artifact_store, (self.path,)
+
+    def _segment_path(self, segment):
+        return os.path.join(self.path, f"segment-{segment:08d}.dat")
+
+    def _segment_ids(self):
+        try:
+            names = os.listdir(self.path)
+        except FileNotFoundError:
+            return []
+        return sorted(int(name[8:16]) for name in names
+                      if name.startswith('segment-') and name.endswith('.dat'))
+
+    @contextmanager
+    def _file_lock(self, operation):
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, 'lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _refresh(self):
+        """Index records appended since the last scan and forget removed segments"""
+        segments = self._segment_ids()
+        removed = set(self._scanned) - set(segments)
+        if removed:
+            self._index = {key: location for key, location in self._index.items()
+                           if location[0] not in removed}
+            for segment in removed:
+                self._scanned.pop(segment, None)
+                self._maps.pop(segment, None)
+        for segment in segments:
+            self._scan(segment)
+
+    def _scan(self, segment):
+        offset = self._scanned.get(segment, 0)
+        with open(self._segment_path(segment), 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            while offset + _HEADER.size <= size:
+                f.seek(offset)
+                magic, key_length, length = _HEADER.unpack(f.read(_HEADER.size))
+                if magic != _MAGIC:
+                    logging.error(f"Corrupt artifact record in segment {segment} at offset {offset}")
+                    break
+                end = offset + _HEADER.size + key_length + length
+                if end > size:
+                    # Torn write from a crashed process; the next append truncates it
+                    break
+                key = f.read(key_length).decode('ascii')
+                self._index[key] = (segment, offset + _HEADER.size + key_length, length)
+                offset = end
+        self._scanned[segment] = offset
+
+    def _view(self, segment, offset, length):
+        mapped = self._maps.get(segment)
+        if mapped is None or len(mapped) < offset + length:
+            # Remap to cover the grown segment; views of the old map stay valid
+            with open(self._segment_path(segment), 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[segment] = mapped
+        return memoryview(mapped)[offset:offset + length]
+
+    def __contains__(self, key):
+        with self._lock:
+            if key in self._index:
+                return True
+            with self._file_lock(fcntl.LOCK_SH):
+                self._refresh()
+            return key in self._index
+
+    def get(self, key):
+        """Return a read-only memoryview of the artifact, or None"""
+        with self._lock:
+            if key not in self:
+                return None
+            try:
+                view = self._view(*self._index[key])
+            except FileNotFoundError:
+                # Compacted away by another process
+                with self._file_lock(fcntl.LOCK_SH):
+                    self._refresh()
+                return None
+            self._recent.add(key)
+            return view
+
+    def put(self, key, data, compact=True):
+        """Append an artifact unless the key is already stored.
+
+        ``compact=False`` leaves compaction to a later put, e.g. for batch
+        render workers that do not know which artifacts their batch pinned.
+        """
+        with self._lock, self._file_lock(fcntl.LOCK_EX):
+            self._refresh()
+            if key in self._index:
+                return
+            self._append(key, data)
+            if compact and self.total_bytes() > max(self.max_bytes, self._compact_at):
+                self._compact()
+
+    def pin(self, keys):
+        """Keep the artifacts whose keys are in the set ``keys`` through compaction.
+
+        The caller may keep adding keys to the set until it calls ``unpin``.
+        """
+        with self._lock:
+            self._pins.append(keys)
+
+    def unpin(self, keys):
+        with self._lock:
+            self._pins = [pinned for pinned in self._pins if pinned is not keys]
+            self._compact_at = 0
+
+    def _pinned(self, key):
+        return any(key in pinned for pinned in self._pins)
+
+    def _append(self, key, data):
+        encoded_key = key.encode('ascii')
+        record_size = _HEADER.size + len(encoded_key) + len(data)
+        segments = self._segment_ids()
+        segment = segments[-1] if segments else 0
+        offset = self._scanned.get(segment, 0)
+        if offset and offset + record_size > self.segment_size:
+            segment += 1
+            offset = 0
+        fd = os.open(self._segment_path(segment), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            # Drop a torn record left behind by a crashed writer
+            if os.fstat(fd).st_size > offset:
+                os.ftruncate(fd, offset)
+            os.pwritev(fd, [_HEADER.pack(_MAGIC, len(encoded_key), len(data)), encoded_key, data], offset)
+        finally:
+            os.close(fd)
+        self._index[key] = (segment, offset + _HEADER.size + len(encoded_key), len(data))
+        self._scanned[segment] = offset + record_size
+
+    def total_bytes(self):
+        return sum(self._scanned.values())
+
+    def compact(self):
+        """Shrink the store below ``max_bytes``; see the module docstring"""
+        with self._lock, self._file_lock(fcntl.LOCK_EX):
+            self._refresh()
+            self._compact()
+
+    def _compact(self):
+        for segment in self._segment_ids()[:-1]:
+            if self.total_bytes() <= self.max_bytes:
+                break
+            keys = [key for key, location in self._index.items() if location[0] == segment]
+            if any(self._pinned(key) for key in keys):
+                continue
+            carried = [key for key in keys if key in self._recent]
+            for key in carried:
+                self._append(key, bytes(self._view(*self._index[key])))
+                # Carried once per read, so artifacts that stop being read age out
+                self._recent.discard(key)
+            os.remove(self._segment_path(segment))
+            self._refresh()
+        # Pinned segments can keep the store above the cap; wait for another
+        # segment's worth of writes before scanning again
+        self._compact_at = self.total_bytes() + self.segment_size if self.total_bytes() > self.max_bytes else 0
+        logging.info(f"Compacted artifact store to {self.total_bytes()} bytes")
+
+    def stats(self):
+        with self._lock:
+            with self._file_lock(fcntl.LOCK_SH):
+                self._refresh()
+            return {'artifacts': len(self._index), 'segments': len(self._scanned),
+                    'bytes': self.total_bytes(), 'max_bytes': self.max_bytes}
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_artifact_store(path=None):
+    """Return the process-wide store for ``path`` so its index is built only once"""
+    path = path or os.environ.get('ARTIFACT_STORE_PATH', DEFAULT_PATH)
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = ArtifactStore(path)
+        return _stores[path]
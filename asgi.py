@@ -0,0 +1,324 @@
+"""ASGI entry point with non-blocking preview, export and batch endpoints.
+
+Serve with an ASGI server, e.g. ``uvicorn asgi:application``. The preview,
+export and batch upload endpoints run natively on the event loop: rendering
+is offloaded to a process pool (or the shared render pool when
+``RENDER_POOL_ADDRESS`` is set) and files are streamed in chunks, so slow
+downloads only hold a coroutine. Exports and previews already in the artifact
+store are read from its memory map one chunk at a time, so a large hit is never
+copied into memory whole. All other routes, and any request these handlers
+decline, are passed to the Flask app on a worker thread.
+"""
+import io
+import os
+import sys
+import json
+import asyncio
+import functools
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from werkzeug.http import parse_cookie
+from werkzeug.wrappers import Request
+from app import (app, card_store, render_pool, EXPORT_TYPES, BatchUploadError, batch_summary_headers,
+                 error_redirect, read_batch_upload, PREVIEW_PROFILE, BATCH_PROFILE)
+from archive import ARCHIVE_FORMATS
+from artifact_store import get_artifact_store
+from card_generator import CardGenerator, normalize_card_data, run_batch
+
+CHUNK_SIZE = 64 * 1024
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        workers = int(os.environ.get('ASYNC_RENDER_WORKERS', '0')) or os.cpu_count() or 1
+        _executor = ProcessPoolExecutor(max_workers=workers,
+                                        mp_context=multiprocessing.get_context('forkserver'))
+    return _executor
+
+
+async def _run_cpu(func, *args):
+    """Run CPU-bound generator work in the render executor"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), func, *args)
+
+
+async def _export_bytes(card_data, export_format, logo_path=None, profile=None):
+    if render_pool:
+        return await asyncio.to_thread(render_pool.export_bytes, card_data, export_format, logo_path,
+                                       None, profile)
+    return await _run_cpu(CardGenerator().export_bytes, card_data, export_format, logo_path, None, profile)
+
+
+def _wsgi_environ(scope, body):
+    """Build a WSGI environ for an ASGI HTTP scope and buffered body"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client')
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0] if client else '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+        'CONTENT_LENGTH': str(len(body)),
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1')
+        value = value.decode('latin-1')
+        if name == 'content-type':
+            environ['CONTENT_TYPE'] = value
+        elif name == 'content-length':
+            continue
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+class _ClientDisconnected(Exception):
+    pass
+
+
+async def _read_body(receive, limit):
+    """Buffer the request body; returns None when it exceeds ``limit``"""
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            raise _ClientDisconnected()
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if limit and size > limit:
+            return None
+        chunks.append(chunk)
+        if not message.get('more_body', False):
+            return b''.join(chunks)
+
+
+async def _start(send, status, headers):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers],
+    })
+
+
+async def _send_bytes(send, data, content_type, download_name=None, status=200, headers=()):
+    headers = [('content-type', content_type), ('content-length', str(len(data)))] + list(headers)
+    if download_name:
+        headers.append(('content-disposition', f'attachment; filename="{download_name}"'))
+    await _start(send, status, headers)
+    for offset in range(0, len(data), CHUNK_SIZE):
+        # ASGI bodies must be bytes; store hits are memoryviews, copied a chunk at a time
+        await send({'type': 'http.response.body', 'body': bytes(data[offset:offset + CHUNK_SIZE]),
+                    'more_body': True})
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+async def _send_file(send, path, content_type, download_name, headers=()):
+    """Stream a file from disk without blocking the event loop"""
+    size = os.path.getsize(path)
+    await _start(send, 200, [
+        ('content-type', content_type),
+        ('content-length', str(size)),
+        ('content-disposition', f'attachment; filename="{download_name}"'),
+    ] + list(headers))
+    f = await asyncio.to_thread(open, path, 'rb')
+    try:
+        while True:
+            chunk = await asyncio.to_thread(f.read, CHUNK_SIZE)
+            if not chunk:
+                break
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+    finally:
+        await asyncio.to_thread(f.close)
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+async def _call_flask(scope, body, send):
+    """Run the Flask WSGI app on a worker thread and relay its response"""
+    environ = _wsgi_environ(scope, body)
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = headers
+        return lambda data: None
+
+    def run():
+        result = app(environ, start_response)
+        return result, iter(result)
+
+    result, chunks = await asyncio.to_thread(run)
+    try:
+        first = await asyncio.to_thread(next, chunks, None)
+        await _start(send, response['status'], response['headers'])
+        chunk = first
+        while chunk is not None:
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            chunk = await asyncio.to_thread(next, chunks, None)
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        if hasattr(result, 'close'):
+            await asyncio.to_thread(result.close)
+
+
+def _flask_call(environ, func, *args):
+    """Call ``func`` in a Flask request context and return the finished response"""
+    with app.request_context(environ):
+        return app.process_response(app.make_response(func(*args)))
+
+
+async def _error_redirect(scope, body, send, message, endpoint):
+    """Flash an error and redirect, as the Flask view does, without running the view again"""
+    response = await asyncio.to_thread(_flask_call, _wsgi_environ(scope, body), error_redirect,
+                                       message, endpoint)
+    await _start(send, response.status_code, response.headers.to_wsgi_list())
+    await send({'type': 'http.response.body', 'body': response.get_data()})
+
+
+def _session_value(scope, key):
+    """Read a value from the signed Flask session cookie"""
+    for name, value in scope.get('headers', []):
+        if name == b'cookie':
+            cookie = parse_cookie(value.decode('latin-1')).get(app.config['SESSION_COOKIE_NAME'])
+            if not cookie:
+                return None
+            serializer = app.session_interface.get_signing_serializer(app)
+            try:
+                max_age = int(app.permanent_session_lifetime.total_seconds())
+                return serializer.loads(cookie, max_age=max_age).get(key)
+            except Exception:
+                return None
+    return None
+
+
+async def _cached_export(card_data, export_format, logo_path=None, profile=None):
+    """Return ``(key, data)`` for an export from the artifact store, rendering it on a miss"""
+    store = get_artifact_store()
+    key = CardGenerator().export_key(card_data, export_format, logo_path, profile)
+    data = await asyncio.to_thread(store.get, key)
+    if data is None:
+        data = await _export_bytes(card_data, export_format, logo_path, profile)
+        await asyncio.to_thread(store.put, key, data)
+    return key, data
+
+
+async def _api_preview(scope, body, send):
+    try:
+        card_data = normalize_card_data(json.loads(body or b'null') or {})
+        key, data = await _cached_export(card_data, 'preview', profile=PREVIEW_PROFILE)
+        preview_path = await asyncio.to_thread(CardGenerator().save_preview, data, PREVIEW_PROFILE, key)
+        result = {'success': True, 'preview_url': preview_path}
+    except Exception as e:
+        result = {'success': False, 'error': str(e)}
+    await _send_bytes(send, json.dumps(result).encode('utf-8'), 'application/json')
+    return True
+
+
+async def _export(scope, body, send, export_format):
+    card_id = _session_value(scope, 'card_id')
+    entry = await asyncio.to_thread(card_store.get, card_id)
+    if not entry:
+        await _error_redirect(scope, body, send, 'No card data found. Please create a card first.', 'index')
+        return True
+    if export_format not in EXPORT_TYPES:
+        await _error_redirect(scope, body, send, 'Invalid export format', 'index')
+        return True
+    try:
+        _, data = await _cached_export(entry['card_data'], export_format, entry['logo_file'])
+    except Exception as e:
+        logging.error(f"Error in export: {str(e)}")
+        await _error_redirect(scope, body, send, f'Error exporting card: {str(e)}', 'index')
+        return True
+    mimetype, download_name = EXPORT_TYPES[export_format]
+    await _send_bytes(send, data, mimetype, download_name)
+    return True
+
+
+async def _preview_image(scope, body, send, name):
+    preview = await asyncio.to_thread(CardGenerator().get_preview, name)
+    if preview is None:
+        # Flask answers 404
+        return False
+    data, mimetype = preview
+    await _send_bytes(send, data, mimetype,
+                      headers=[('cache-control', 'public, max-age=31536000, immutable')])
+    return True
+
+
+async def _batch_upload(scope, body, send):
+    req = Request(_wsgi_environ(scope, body))
+    owner = _session_value(scope, 'batch_owner')
+    try:
+        csv_data, settings = await asyncio.to_thread(read_batch_upload, req, owner)
+    except BatchUploadError as e:
+        if owner is None:
+            # Flask starts the session a batch series needs; nothing was rendered yet
+            return False
+        await _error_redirect(scope, body, send, str(e), 'batch')
+        return True
+    try:
+        zip_path, summary = await _run_cpu(functools.partial(run_batch, csv_data, image_profile=BATCH_PROFILE,
+                                                             **settings))
+    except Exception as e:
+        logging.error(f"Error in batch upload: {str(e)}")
+        await _error_redirect(scope, body, send, f'Error processing batch: {str(e)}', 'batch')
+        return True
+    extension, mimetype = ARCHIVE_FORMATS[settings['archive_format']]
+    await _send_file(send, zip_path, mimetype, f'business_cards_batch.{extension}',
+                     headers=batch_summary_headers(summary))
+    return True
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                _get_executor()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if _executor is not None:
+                    _executor.shutdown(wait=False, cancel_futures=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    if scope['type'] != 'http':
+        return
+
+    try:
+        body = await _read_body(receive, app.config.get('MAX_CONTENT_LENGTH'))
+    except _ClientDisconnected:
+        return
+    if body is None:
+        await _send_bytes(send, b'Request Entity Too Large', 'text/plain', status=413)
+        return
+
+    method, path = scope['method'], scope['path']
+    handled = False
+    if method == 'POST' and path == '/api/preview':
+        handled = await _api_preview(scope, body, send)
+    elif method == 'GET' and path.startswith('/previews/'):
+        handled = await _preview_image(scope, body, send, path[len('/previews/'):])
+    elif method == 'GET' and path.startswith('/export/'):
+        handled = await _export(scope, body, send, path[len('/export/'):])
+    elif method == 'POST' and path == '/batch/upload':
+        handled = await _batch_upload(scope, body, send)
+
+    if not handled:
+        await _call_flask(scope, body, send)
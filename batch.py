@@ -0,0 +1,300 @@
+"""CSV batch helpers: column mapping, row normalization, content hashing and
+checkpointed batch jobs."""
+import io
+import os
+import re
+import csv
+import json
+import fcntl
+import shutil
+import hashlib
+import logging
+import tempfile
+from card_record import CardRecord, json_default
+
+# Card fields and the CSV headers accepted for each, in order of preference
+COLUMN_ALIASES = {
+    'name': ('name', 'Name'),
+    'job_title': ('job_title', 'Job Title', 'title'),
+    'company': ('company', 'Company'),
+    'email': ('email', 'Email'),
+    'phone': ('phone', 'Phone'),
+    'website': ('website', 'Website'),
+    'address': ('address', 'Address'),
+}
+
+SOCIAL_COLUMNS = ('linkedin', 'twitter', 'instagram', 'github', 'facebook', 'tiktok')
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def clean_text(value):
+    """Trim a CSV value and collapse runs of whitespace"""
+    if not value:
+        return ''
+    return _WHITESPACE.sub(' ', str(value)).strip()
+
+
+class ColumnMapper:
+    """Maps CSV rows to card fields, with header aliases resolved once per file"""
+
+    def __init__(self, fieldnames):
+        present = set(fieldnames or ())
+        self.columns = []
+        for field, aliases in COLUMN_ALIASES.items():
+            header = next((alias for alias in aliases if alias in present), None)
+            if header is not None:
+                self.columns.append((field, header))
+        self.social_columns = [column for column in SOCIAL_COLUMNS if column in present]
+
+    def map(self, row, **settings):
+        """Return a ``CardRecord`` with normalized text and social media for one
+        CSV row; ``settings`` (template, font, color, ...) are passed through"""
+        text = {field: clean_text(row.get(header)) for field, header in self.columns}
+        social_media = {}
+        for column in self.social_columns:
+            value = clean_text(row.get(column))
+            if value:
+                social_media[column] = value
+        return CardRecord(social_media=social_media, **text, **settings)
+
+
+class CsvSource:
+    """CSV rows parsed lazily from uploaded text.
+
+    Iterating yields one row dict at a time, so a batch holds the text and
+    the row being rendered rather than every row. Sources can be iterated
+    more than once and pickled to render processes.
+    """
+
+    def __init__(self, text):
+        self.text = text
+
+    def __iter__(self):
+        return csv.DictReader(io.StringIO(self.text, newline=None))
+
+
+def card_content_hash(card_data):
+    """Hash the exact card content that gets rendered.
+
+    The hash keys rendered cards in the artifact store and detects changed
+    rows, so any difference in the rendered text, including case, must
+    change it. Spacing is already normalized by ``clean_text``.
+    """
+    canonical = json.dumps(card_data, sort_keys=True, separators=(',', ':'), default=json_default)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+# Limits checked before rendering so bad rows are reported instead of
+# failing deep inside the renderer
+MAX_FIELD_LENGTH = 500
+QR_CAPACITY = 2953  # bytes at version 40, error correction level L
+
+BATCH_JOB_ROOT = os.path.join('exports', 'batch_jobs')
+BATCH_MANIFEST_ROOT = os.path.join('exports', 'batch_manifests')
+
+
+def artifact_key(content_hash, export_format, profile, dpi):
+    """Key of a rendered card in the artifact store"""
+    return hashlib.sha256(f"{content_hash}|{export_format}|{profile}|{dpi}".encode('utf-8')).hexdigest()
+
+
+def make_job_id(csv_bytes, settings):
+    """Derive a job id from the uploaded CSV and batch settings, so re-running
+    the same upload resumes the same job"""
+    digest = hashlib.sha256(csv_bytes)
+    digest.update(json.dumps(settings, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()[:24]
+
+
+def validate_card(card_data, vcard=None):
+    """Raise ValueError describing the first problem that would break rendering"""
+    for field, value in card_data.items():
+        if not isinstance(value, str):
+            continue
+        if any('\udc80' <= ch <= '\udcff' for ch in value):
+            raise ValueError(f"Invalid UTF-8 in {field}")
+        if len(value) > MAX_FIELD_LENGTH:
+            raise ValueError(f"{field} is longer than {MAX_FIELD_LENGTH} characters")
+    for platform, value in card_data.get('social_media', {}).items():
+        if any('\udc80' <= ch <= '\udcff' for ch in value):
+            raise ValueError(f"Invalid UTF-8 in {platform}")
+    if vcard is not None and len(vcard.encode('utf-8')) > QR_CAPACITY:
+        raise ValueError(f"QR code payload exceeds {QR_CAPACITY} bytes")
+
+
+class BatchJob:
+    """On-disk checkpoint of a batch run.
+
+    Finished rows are appended to a manifest in row order once their card
+    bytes are in the artifact store, so an interrupted run resumes where it
+    stopped. Failed rows are recorded with their error instead of aborting
+    the run; the batch retries them when it resumes. Only rows finished by
+    earlier runs are kept in memory (``done``); ``entries()`` reads the full
+    manifest back.
+    """
+
+    def __init__(self, job_id, root=BATCH_JOB_ROOT):
+        self.job_id = job_id
+        self.path = os.path.join(root, job_id)
+        self.manifest_path = os.path.join(self.path, 'manifest.jsonl')
+        self.done = {}
+        self._manifest = None
+        self._lock_file = None
+
+    def open(self):
+        """Create or reopen the job directory and load completed rows"""
+        os.makedirs(self.path, exist_ok=True)
+        self._lock_file = open(os.path.join(self.path, 'lock'), 'w')
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._lock_file.close()
+            raise RuntimeError('This batch is already being processed')
+        self._manifest = open(self.manifest_path, 'a+', encoding='utf-8')
+        self._manifest.seek(0)
+        valid = 0
+        for line in self._manifest:
+            if not line.endswith('\n'):
+                # Partial line from an interrupted write
+                break
+            entry = json.loads(line)
+            self.done[entry['row']] = entry
+            valid += len(line.encode('utf-8'))
+        self._manifest.truncate(valid)
+        return self
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def record(self, entry):
+        """Append a finished row to the manifest"""
+        self._manifest.write(json.dumps(entry) + '\n')
+        self._manifest.flush()
+
+    def entries(self):
+        """Yield the manifest entries of every finished row, in the order they finished"""
+        with open(self.manifest_path, encoding='utf-8') as f:
+            for line in f:
+                yield json.loads(line)
+
+    def forget(self, rows):
+        """Drop rows from the checkpoint so this run processes them again"""
+        rows = set(rows)
+        if not rows:
+            return
+        temp_path = self.manifest_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            for entry in self.entries():
+                if entry['row'] not in rows:
+                    f.write(json.dumps(entry) + '\n')
+        os.replace(temp_path, self.manifest_path)
+        self._manifest.close()
+        self._manifest = open(self.manifest_path, 'a+', encoding='utf-8')
+        for row in rows:
+            self.done.pop(row, None)
+
+    def error_report(self):
+        """Return a CSV of failed rows with their error and original values, or None"""
+        failed = [entry for entry in self.entries() if entry['status'] == 'error']
+        if not failed:
+            return None
+        columns = []
+        for entry in failed:
+            columns.extend(column for column in entry.get('values', {}) if column not in columns)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(['row', 'error'] + columns)
+        for entry in failed:
+            values = entry.get('values', {})
+            writer.writerow([entry['row'] + 1, entry['error']] + [values.get(column, '') for column in columns])
+        # Undecodable input bytes are written back unchanged
+        return buffer.getvalue().encode('utf-8', errors='surrogateescape')
+
+    def close(self):
+        if self._manifest is not None:
+            self._manifest.close()
+            self._manifest = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def remove(self):
+        """Delete the job directory once its archive has been built"""
+        self.close()
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+class BatchManifest:
+    """Row keys and content hashes of the last batch of a series for one
+    template, font, color and format, used to tell which rows of a new upload
+    changed.
+
+    A series is one uploader's list, e.g. ``<session id>/<series name>``, so
+    uploads are never compared with another uploader's rows. Without a
+    series every row is added and nothing is saved. Rows are keyed by email,
+    falling back to name and then row position, so reordered rows still
+    match their previous version.
+    """
+
+    def __init__(self, template, font, color, export_format, series=None, root=BATCH_MANIFEST_ROOT):
+        self.path = None
+        self.previous = {}
+        self._seen = {}
+        if series is None:
+            return
+        name = hashlib.sha256(f"{series}|{template}|{font}|{color}|{export_format}".encode('utf-8')).hexdigest()[:24]
+        self.path = os.path.join(root, f"{name}.json")
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    self.previous = json.load(f)['rows']
+            except (OSError, ValueError, KeyError) as e:
+                logging.error(f"Ignoring unreadable batch manifest {self.path}: {str(e)}")
+
+    def row_key(self, card_data, index):
+        """Stable key for a row; repeated keys within one upload get a counter"""
+        key = (card_data.get('email') or card_data.get('name') or f"row:{index}").casefold()
+        count = self._seen.get(key, 0) + 1
+        self._seen[key] = count
+        return key if count == 1 else f"{key}#{count}"
+
+    def classify(self, key, content_hash):
+        """Return ``added``, ``changed`` or ``unchanged`` for a row"""
+        previous = self.previous.get(key)
+        if previous is None:
+            return 'added'
+        return 'unchanged' if previous == content_hash else 'changed'
+
+    def _rows(self, entries):
+        # Rows that failed keep their previous entry, so they are compared
+        # against their last good version next time
+        rows = {}
+        for entry in entries:
+            key = entry.get('key')
+            if entry['status'] == 'ok':
+                rows[key] = entry['hash']
+            elif key in self.previous:
+                rows[key] = self.previous[key]
+        return rows
+
+    def removed(self, entries):
+        """Keys of rows in the previous batch that are missing from ``entries``"""
+        rows = self._rows(entries)
+        return sorted(key for key in self.previous if key not in rows)
+
+    def save(self, entries):
+        """Replace the manifest with the rows of a finished batch"""
+        rows = self._rows(entries)
+        if self.path is None:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # Concurrent batches of one series each write a complete manifest; the last one wins
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'rows': rows}, f)
+        os.replace(tmp_path, self.path)
+        self.previous = rows
@@ -1,4 +1,7 @@
 import os
+import io
+import json
+import hashlib
 import qrcode
 from qrcode import constants
 from PIL import Image, ImageDraw, ImageFont
@@ -6,143 +9,60 @@ from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
 from reportlab.lib import colors
 from reportlab.lib.colors import Color, black, white
-import zipfile
-import tempfile
 import uuid
 import logging
+import multiprocessing
+from html import escape
+from collections import deque
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from types import MappingProxyType
+from archive import ArchiveWriter, archive_path
+from artifact_store import get_artifact_store
+from card_record import CARD_TEXT_FIELDS, CardRecord, json_default
+from contacts import normalize_contact, render_vcard
+from batch import BatchJob, BatchManifest, ColumnMapper, artifact_key, card_content_hash, validate_card
+from encoders import ENCODER_PROFILES, encode_image, get_profile
+from text_layout import FIT_MODES, fit_text, text_width
 
 class CardGenerator:
     """Business card generator with multiple export formats"""
     
-    def __init__(self):
+    def __init__(self, artifact_store=None, dpi=300):
         self.card_width = 400
         self.card_height = 240
-        self.dpi = 300
+        self.dpi = dpi
+        self.last_batch_summary = None
+        self.artifact_store = artifact_store or get_artifact_store()
         
     @staticmethod
     def get_available_templates():
         """Return available card templates"""
-        return [
-            {'id': 'modern', 'name': 'Modern', 'description': 'Clean and minimalist design'},
-            {'id': 'classic', 'name': 'Classic', 'description': 'Traditional business card layout'},
-            {'id': 'creative', 'name': 'Creative', 'description': 'Bold and colorful design'},
-            {'id': 'elegant', 'name': 'Elegant', 'description': 'Sophisticated and professional'},
-            {'id': 'tech', 'name': 'Tech', 'description': 'Modern technology-focused design'},
-            {'id': 'corporate', 'name': 'Corporate', 'description': 'Professional business style'},
-            {'id': 'artistic', 'name': 'Artistic', 'description': 'Creative with artistic flair'},
-            {'id': 'minimal', 'name': 'Minimal', 'description': 'Ultra-clean simple design'},
-            {'id': 'bold', 'name': 'Bold', 'description': 'Strong visual impact design'},
-            {'id': 'vintage', 'name': 'Vintage', 'description': 'Retro classic appearance'},
-            {'id': 'geometric', 'name': 'Geometric', 'description': 'Modern geometric patterns'},
-            {'id': 'gradient', 'name': 'Gradient', 'description': 'Smooth color transitions'},
-            {'id': 'executive', 'name': 'Executive', 'description': 'Premium luxury design'}
-        ]
+        return _registry['template_list']
     
     @staticmethod
     def get_available_fonts():
         """Return available fonts"""
-        return [
-            {'id': 'Arial', 'name': 'Arial'},
-            {'id': 'Helvetica', 'name': 'Helvetica'},
-            {'id': 'Times', 'name': 'Times New Roman'},
-            {'id': 'Georgia', 'name': 'Georgia'},
-            {'id': 'Verdana', 'name': 'Verdana'},
-            {'id': 'Calibri', 'name': 'Calibri'},
-            {'id': 'Trebuchet', 'name': 'Trebuchet MS'},
-            {'id': 'Tahoma', 'name': 'Tahoma'},
-            {'id': 'Impact', 'name': 'Impact'},
-            {'id': 'Palatino', 'name': 'Palatino'},
-            {'id': 'Garamond', 'name': 'Garamond'},
-            {'id': 'Century', 'name': 'Century Gothic'}
-        ]
+        return _registry['font_list']
     
     @staticmethod
     def get_available_colors():
         """Return available color schemes"""
-        return [
-            {'id': 'blue', 'name': 'Blue', 'primary': '#007bff', 'secondary': '#6c757d'},
-            {'id': 'red', 'name': 'Red', 'primary': '#dc3545', 'secondary': '#6c757d'},
-            {'id': 'green', 'name': 'Green', 'primary': '#28a745', 'secondary': '#6c757d'},
-            {'id': 'purple', 'name': 'Purple', 'primary': '#6f42c1', 'secondary': '#6c757d'},
-            {'id': 'orange', 'name': 'Orange', 'primary': '#fd7e14', 'secondary': '#6c757d'},
-            {'id': 'black', 'name': 'Black', 'primary': '#000000', 'secondary': '#6c757d'},
-            {'id': 'teal', 'name': 'Teal', 'primary': '#20c997', 'secondary': '#6c757d'},
-            {'id': 'indigo', 'name': 'Indigo', 'primary': '#6610f2', 'secondary': '#6c757d'},
-            {'id': 'pink', 'name': 'Pink', 'primary': '#e83e8c', 'secondary': '#6c757d'},
-            {'id': 'yellow', 'name': 'Yellow', 'primary': '#ffc107', 'secondary': '#495057'},
-            {'id': 'cyan', 'name': 'Cyan', 'primary': '#17a2b8', 'secondary': '#6c757d'},
-            {'id': 'brown', 'name': 'Brown', 'primary': '#8d4925', 'secondary': '#6c757d'},
-            {'id': 'navy', 'name': 'Navy', 'primary': '#1e3a8a', 'secondary': '#64748b'},
-            {'id': 'emerald', 'name': 'Emerald', 'primary': '#059669', 'secondary': '#6b7280'},
-            {'id': 'rose', 'name': 'Rose', 'primary': '#e11d48', 'secondary': '#6b7280'},
-            {'id': 'amber', 'name': 'Amber', 'primary': '#f59e0b', 'secondary': '#374151'},
-            {'id': 'violet', 'name': 'Violet', 'primary': '#8b5cf6', 'secondary': '#6b7280'},
-            {'id': 'slate', 'name': 'Slate', 'primary': '#475569', 'secondary': '#94a3b8'}
-        ]
+        return _registry['color_list']
     
     def get_color_scheme(self, color_id):
         """Get color scheme by ID"""
-        colors = self.get_available_colors()
-        for color in colors:
-            if color['id'] == color_id:
-                return color
-        return colors[0]  # Default to blue
+        return COLOR_SCHEMES.get(color_id) or COLOR_SCHEMES[DEFAULT_COLOR]
+    
+    def build_vcard(self, card_data):
+        """Build the vCard payload encoded in the QR code"""
+        return normalize_contact(card_data).vcard
     
     def generate_qr_code(self, card_data):
         """Generate QR code with vCard data"""
         try:
-            # Create vCard format with social media
-            vcard_lines = [
-                "BEGIN:VCARD",
-                "VERSION:3.0",
-                f"FN:{card_data.get('name', '')}",
-                f"ORG:{card_data.get('company', '')}",
-                f"TITLE:{card_data.get('job_title', '')}",
-                f"EMAIL:{card_data.get('email', '')}",
-                f"TEL:{card_data.get('phone', '')}",
-                f"URL:{card_data.get('website', '')}"
-            ]
-            
-            # Add social media URLs to vCard
-            if card_data.get('social_media'):
-                for platform, value in card_data['social_media'].items():
-                    if value:
-                        if platform == 'linkedin' and value.startswith('http'):
-                            vcard_lines.append(f"URL:{value}")
-                        elif platform == 'twitter':
-                            twitter_url = value if value.startswith('http') else f"https://twitter.com/{value.lstrip('@')}"
-                            vcard_lines.append(f"URL:{twitter_url}")
-                        elif platform == 'instagram':
-                            instagram_url = value if value.startswith('http') else f"https://instagram.com/{value.lstrip('@')}"
-                            vcard_lines.append(f"URL:{instagram_url}")
-                        elif platform == 'github':
-                            github_url = value if value.startswith('http') else f"https://github.com/{value}"
-                            vcard_lines.append(f"URL:{github_url}")
-                        elif platform == 'facebook':
-                            facebook_url = value if value.startswith('http') else f"https://facebook.com/{value}"
-                            vcard_lines.append(f"URL:{facebook_url}")
-                        elif platform == 'tiktok':
-                            tiktok_url = value if value.startswith('http') else f"https://tiktok.com/@{value.lstrip('@')}"
-                            vcard_lines.append(f"URL:{tiktok_url}")
-            
-            vcard_lines.extend([
-                f"ADR:;;{card_data.get('address', '')};;;;",
-                "END:VCARD"
-            ])
-            
-            vcard = '\n'.join(vcard_lines)
-            
-            qr = qrcode.QRCode(
-                version=1,
-                error_correction=constants.ERROR_CORRECT_L,
-                box_size=10,
-                border=4,
-            )
-            qr.add_data(vcard)
-            qr.make(fit=True)
-            
-            qr_img = qr.make_image(fill_color="black", back_color="white")
-            return qr_img
+            return _make_qr_image(self.build_vcard(card_data))
         except Exception as e:
             logging.error(f"Error generating QR code: {str(e)}")
             return None
@@ -150,294 +70,189 @@ class CardGenerator:
     def create_card_image(self, card_data, logo_path=None):
         """Create business card image"""
         try:
-            # Create blank image
-            img = Image.new('RGB', (self.card_width, self.card_height), 'white')
-            draw = ImageDraw.Draw(img)
-            
-            # Get color scheme
-            color_scheme = self.get_color_scheme(card_data.get('color', 'blue'))
-            primary_color = color_scheme['primary']
-            
-            # Apply template-specific styling
-            template = card_data.get('template', 'modern')
-            self._apply_template_styling(draw, img, template, primary_color)
-            
-            # Load font (fallback to default if not available)
-            try:
-                font_large = ImageFont.truetype("arial.ttf", 24)
-                font_medium = ImageFont.truetype("arial.ttf", 16)
-                font_small = ImageFont.truetype("arial.ttf", 12)
-            except (OSError, IOError):
-                try:
-                    font_large = ImageFont.load_default()
-                    font_medium = ImageFont.load_default()
-                    font_small = ImageFont.load_default()
-                except (OSError, IOError):
-                    font_large = font_medium = font_small = None
-            
-            # Calculate text positioning
-            text_align = card_data.get('text_align', 'left')
-            x_offset = 20 if text_align == 'left' else self.card_width // 2
-            y_start = 30
-            line_height = 25
-            
-            # Draw text elements
-            y_pos = y_start
-            
-            # Name (largest)
-            name = card_data.get('name', '')
-            if name and font_large:
-                if text_align == 'center':
-                    bbox = draw.textbbox((0, 0), name, font=font_large)
-                    text_width = bbox[2] - bbox[0]
-                    x_pos = (self.card_width - text_width) // 2
-                else:
-                    x_pos = x_offset
-                draw.text((x_pos, y_pos), name, fill=primary_color, font=font_large)
-                y_pos += line_height + 5
-            
-            # Job title
-            job_title = card_data.get('job_title', '')
-            if job_title and font_medium:
-                if text_align == 'center':
-                    bbox = draw.textbbox((0, 0), job_title, font=font_medium)
-                    text_width = bbox[2] - bbox[0]
-                    x_pos = (self.card_width - text_width) // 2
-                else:
-                    x_pos = x_offset
-                draw.text((x_pos, y_pos), job_title, fill='black', font=font_medium)
-                y_pos += line_height
-            
-            # Company
-            company = card_data.get('company', '')
-            if company and font_medium:
-                if text_align == 'center':
-                    bbox = draw.textbbox((0, 0), company, font=font_medium)
-                    text_width = bbox[2] - bbox[0]
-                    x_pos = (self.card_width - text_width) // 2
-                else:
-                    x_pos = x_offset
-                draw.text((x_pos, y_pos), company, fill=color_scheme['secondary'], font=font_medium)
-                y_pos += line_height + 10
-            
-            # Contact information with text labels
-            contact_info = []
-            if card_data.get('email'):
-                contact_info.append(f"Email: {card_data['email']}")
-            if card_data.get('phone'):
-                contact_info.append(f"Phone: {card_data['phone']}")
-            if card_data.get('website'):
-                contact_info.append(f"Web: {card_data['website']}")
-            if card_data.get('address'):
-                contact_info.append(f"Address: {card_data['address']}")
-            
-            # Social media information
-            social_info = []
-            social_labels = {
-                'linkedin': 'LinkedIn:',
-                'twitter': 'Twitter:',
-                'instagram': 'Instagram:',
-                'github': 'GitHub:',
-                'facebook': 'Facebook:',
-                'tiktok': 'TikTok:'
-            }
-            
-            if card_data.get('social_media'):
-                for platform, value in card_data['social_media'].items():
-                    if value:
-                        label = social_labels.get(platform, 'Social:')
-                        if platform == 'linkedin':
-                            display_value = value.replace('https://linkedin.com/in/', 'in/').replace('https://www.linkedin.com/in/', 'in/')
-                        elif platform in ['twitter', 'instagram', 'tiktok']:
-                            display_value = value if value.startswith('@') else f"@{value}"
-                        elif platform == 'github':
-                            display_value = value.replace('github.com/', '').replace('https://github.com/', '')
-                        elif platform == 'facebook':
-                            display_value = value.replace('https://facebook.com/', '').replace('https://www.facebook.com/', '')
-                        else:
-                            display_value = value
-                        social_info.append(f"{label} {display_value}")
-            
-            # Combine contact and social info
-            all_contact_info = contact_info + social_info
-            
-            for info in all_contact_info:
-                if font_small:
-                    if text_align == 'center':
-                        bbox = draw.textbbox((0, 0), info, font=font_small)
-                        text_width = bbox[2] - bbox[0]
-                        x_pos = (self.card_width - text_width) // 2
-                    else:
-                        x_pos = x_offset
-                    draw.text((x_pos, y_pos), info, fill='black', font=font_small)
-                    y_pos += 18
-            
-            # Add logo if provided
-            if logo_path and os.path.exists(logo_path):
-                try:
-                    logo = Image.open(logo_path)
-                    logo.thumbnail((60, 60), Image.Resampling.LANCZOS)
-                    logo_x = self.card_width - logo.width - 20
-                    logo_y = 20
-                    img.paste(logo, (logo_x, logo_y))
-                except Exception as e:
-                    logging.error(f"Error adding logo: {str(e)}")
-            
-            # Add QR code if requested
-            if card_data.get('include_qr', False):
-                qr_img = self.generate_qr_code(card_data)
-                if qr_img:
-                    qr_img = qr_img.resize((60, 60), Image.Resampling.LANCZOS)
-                    qr_x = self.card_width - 80
-                    qr_y = self.card_height - 80
-                    img.paste(qr_img, (qr_x, qr_y))
-            
-            return img
+            layout = self.prepare_layout(card_data.get('template', 'modern'),
+                                         card_data.get('color', 'blue'),
+                                         card_data.get('font', 'Arial'),
+                                         card_data.get('text_align', 'left'),
+                                         card_data.get('text_fit', 'wrap'))
+            return layout.render(card_data, logo_path)
         
         except Exception as e:
             logging.error(f"Error creating card image: {str(e)}")
             raise
     
-    def _apply_template_styling(self, draw, img, template, primary_color):
+    def prepare_layout(self, template, color, font='Arial', text_align='left', text_fit='wrap'):
+        """Prepare the row-invariant parts of a card render for reuse across cards"""
+        return CardLayout(self, template, color, font, text_align, text_fit)
+    
+    def _qr_thumbnail(self, card_data, size):
+        """Return the cached, resized QR code for a card, or None on failure"""
+        try:
+            return _qr_thumbnail(self.build_vcard(card_data), size)
+        except Exception as e:
+            logging.error(f"Error generating QR code: {str(e)}")
+            return None
+    
+    def _apply_template_styling(self, draw, img, template, color_scheme):
         """Apply template-specific styling"""
-        if template == 'modern':
-            # Modern: Clean lines and accent border
-            draw.rectangle([(0, 0), (self.card_width, 5)], fill=primary_color)
-        
-        elif template == 'classic':
-            # Classic: Simple border
-            draw.rectangle([(0, 0), (self.card_width-1, self.card_height-1)], 
-                         outline='black', width=2)
-        
-        elif template == 'creative':
-            # Creative: Colorful background gradient effect
-            for i in range(self.card_height):
-                alpha = int(255 * (1 - i / self.card_height) * 0.1)
-                color = self._hex_to_rgb(primary_color) + (alpha,)
-                draw.line([(0, i), (self.card_width, i)], fill=color[:3])
-        
-        elif template == 'elegant':
-            # Elegant: Subtle corner decorations
-            draw.rectangle([(0, 0), (50, 5)], fill=primary_color)
-            draw.rectangle([(self.card_width-50, self.card_height-5), 
-                          (self.card_width, self.card_height)], fill=primary_color)
-        
-        elif template == 'tech':
-            # Tech: Geometric patterns
-            draw.rectangle([(0, 0), (10, self.card_height)], fill=primary_color)
-            for i in range(0, self.card_width, 40):
-                draw.line([(i, 0), (i+20, 20)], fill=primary_color, width=1)
-        
-        elif template == 'corporate':
-            # Corporate: Professional double border
-            draw.rectangle([(0, 0), (self.card_width-1, self.card_height-1)], 
-                         outline=primary_color, width=3)
-            draw.rectangle([(5, 5), (self.card_width-6, self.card_height-6)], 
-                         outline=primary_color, width=1)
-        
-        elif template == 'artistic':
-            # Artistic: Creative curved lines
-            rgb = self._hex_to_rgb(primary_color)
-            for i in range(0, self.card_width, 20):
-                x = i
-                y = int(20 * (1 + 0.5 * (i / self.card_width)))
-                draw.ellipse([(x-10, y-10), (x+10, y+10)], outline=rgb, width=2)
-        
-        elif template == 'minimal':
-            # Minimal: Just a subtle line
-            draw.line([(20, self.card_height-20), (self.card_width-20, self.card_height-20)], 
-                     fill=primary_color, width=1)
-        
-        elif template == 'bold':
-            # Bold: Strong geometric shapes
-            draw.rectangle([(0, 0), (30, self.card_height)], fill=primary_color)
-            draw.polygon([(30, 0), (60, 0), (30, 30)], fill=primary_color)
-        
-        elif template == 'vintage':
-            # Vintage: Ornate corner elements
-            rgb = self._hex_to_rgb(primary_color)
-            # Top corners
-            for i in range(3):
-                draw.rectangle([(10+i*5, 10+i*2), (40-i*5, 12+i*2)], outline=rgb)
-                draw.rectangle([(self.card_width-40+i*5, 10+i*2), 
-                              (self.card_width-10-i*5, 12+i*2)], outline=rgb)
-        
-        elif template == 'geometric':
-            # Geometric: Modern shapes pattern
-            rgb = self._hex_to_rgb(primary_color)
-            for i in range(0, self.card_width, 60):
-                # Triangles
-                draw.polygon([(i, 0), (i+15, 0), (i+7, 15)], fill=rgb)
-                # Circles
-                draw.ellipse([(i+20, 5), (i+35, 20)], outline=rgb, width=2)
-        
-        elif template == 'gradient':
-            # Gradient: Smooth color transition
-            rgb = self._hex_to_rgb(primary_color)
-            for i in range(self.card_height):
-                opacity = int(255 * (1 - i / self.card_height) * 0.3)
-                if opacity > 0:
-                    color = tuple(min(255, c + opacity//3) for c in rgb)
-                    draw.line([(0, i), (self.card_width, i)], fill=color)
-        
-        elif template == 'executive':
-            # Executive: Luxury gold-style accent
-            draw.rectangle([(0, 0), (self.card_width, 8)], fill=primary_color)
-            draw.rectangle([(0, self.card_height-8), (self.card_width, self.card_height)], 
-                         fill=primary_color)
-            # Side accent
-            draw.rectangle([(self.card_width-8, 0), (self.card_width, self.card_height)], 
-                         fill=primary_color)
+        renderer = _TEMPLATE_RENDERERS.get(template)
+        if renderer:
+            renderer(self, draw, img, color_scheme)
+    
+    def _apply_pdf_styling(self, c, template, color_scheme, x, y, scale):
+        """Draw template decoration as vectors into the card box at ``x``, ``y`` on a PDF canvas"""
+        draw = _PdfDraw(c, x, y, scale, self.card_height)
+        # Clip to the card like the edges of the raster image do
+        c.saveState()
+        path = c.beginPath()
+        path.rect(x, y, self.card_width * scale, self.card_height * scale)
+        c.clipPath(path, stroke=0, fill=0)
+        pdf_renderer = _TEMPLATE_PDF_RENDERERS.get(template)
+        if pdf_renderer:
+            pdf_renderer(self, draw, color_scheme)
+        elif template in _TEMPLATE_RENDERERS:
+            _TEMPLATE_RENDERERS[template](self, draw, None, color_scheme)
+        c.restoreState()
+        return draw
+    
+    def _draw_pdf_qr(self, draw, card_data):
+        """Draw the card's QR code as vectors where the raster card places it"""
+        if not card_data.get('include_qr', False):
+            return
+        try:
+            draw.qr_code(self.build_vcard(card_data), self.card_width - 80, self.card_height - 80, 60)
+        except Exception as e:
+            logging.error(f"Error generating QR code: {str(e)}")
     
     def _hex_to_rgb(self, hex_color):
         """Convert hex color to RGB tuple"""
-        hex_color = hex_color.lstrip('#')
-        return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
+        return _hex_to_rgb(hex_color)
     
-    def generate_preview(self, card_data, logo_path=None):
+    def template_gallery(self, profile='webp'):
+        """Return the key of the template gallery sprite sheet and its tile map with the sprite URL.
+
+        The sheet has one row per template and one column per color scheme;
+        the map gives each tile's offset. It is rendered once per process and
+        registry version, and keyed by its bytes, so it can be cached for as
+        long as its key is unchanged.
+        """
+        key, data, tiles = _gallery(_registry['version'], profile)
+        return key, dict(tiles, sprite=self.save_preview(data, profile, key))
+    
+    def generate_preview(self, card_data, logo_path=None, img=None):
         """Generate preview image"""
+        return self.save_preview(self.render_preview(card_data, logo_path, img), 'fast')
+    
+    def render_preview(self, card_data, logo_path=None, img=None, profile='fast'):
+        """Render preview image bytes with the given encoder profile"""
         try:
-            img = self.create_card_image(card_data, logo_path)
-            
-            # Save preview
-            preview_filename = f"preview_{uuid.uuid4().hex}.png"
-            preview_path = os.path.join('static', 'previews')
-            os.makedirs(preview_path, exist_ok=True)
-            full_path = os.path.join(preview_path, preview_filename)
+            if img is None:
+                img = self.create_card_image(card_data, logo_path)
             
-            img.save(full_path, 'PNG')
-            return f"/static/previews/{preview_filename}"
+            return encode_image(img, profile)
         
         except Exception as e:
             logging.error(f"Error generating preview: {str(e)}")
             raise
     
-    def generate_png(self, card_data, logo_path=None):
-        """Generate PNG export"""
+    def save_preview(self, data, profile='fast', key=None):
+        """Keep preview image bytes encoded with ``profile`` in the artifact store and return their URL.
+
+        ``key`` is a content key for the bytes, e.g. their export key.
+        Previews are stored in their own namespace with the profile, so the
+        preview route can only serve images, never other stored exports.
+        """
+        name = f"{profile}-{key or hashlib.sha256(data).hexdigest()}"
+        if f"preview-{name}" not in self.artifact_store:
+            self.artifact_store.put(f"preview-{name}", data)
+        return f"/previews/{name}.{get_profile(profile)['extension']}"
+    
+    def get_preview(self, name):
+        """Return ``(data, mimetype)`` for a preview URL name from ``save_preview``, or None"""
+        stem, _, extension = name.rpartition('.')
+        profile = ENCODER_PROFILES.get(stem.partition('-')[0])
+        if profile is None or profile['extension'] != extension:
+            return None
+        data = self.artifact_store.get(f"preview-{stem}")
+        return None if data is None else (data, profile['mimetype'])
+    
+    def export_bytes(self, card_data, export_format, logo_path=None, img=None, profile=None):
+        """Render an export format to bytes, reusing a pre-rendered card image if given.
+
+        ``profile`` overrides the encoder profile used for raster formats.
+        """
+        if export_format == 'preview':
+            return self.render_preview(card_data, logo_path, img, profile or 'fast')
+        elif export_format == 'png':
+            return self.render_png(card_data, logo_path, img, profile or 'print')
+        elif export_format == 'jpg':
+            return self.render_png(card_data, logo_path, img, profile or 'jpeg')
+        elif export_format == 'webp':
+            return self.render_png(card_data, logo_path, img, profile or 'webp')
+        elif export_format == 'pdf':
+            return self.render_pdf(card_data, logo_path)
+        elif export_format == 'pdf_print':
+            return self.render_print_pdf(card_data, logo_path)
+        elif export_format == 'html':
+            return self.render_animated_html(card_data, logo_path)
+        elif export_format == 'vcf':
+            return render_vcard(card_data)
+        raise ValueError(f"Unsupported export format: {export_format}")
+    
+    def export_key(self, card_data, export_format, logo_path=None, profile=None):
+        """Artifact store key for an export of exactly this card and logo file"""
+        payload = {'card_data': card_data, 'format': export_format, 'profile': profile, 'logo': logo_path}
+        if logo_path and os.path.exists(logo_path):
+            stat = os.stat(logo_path)
+            payload['logo_stat'] = [stat.st_size, stat.st_mtime_ns]
+        encoded = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=json_default).encode('utf-8')
+        return hashlib.sha256(encoded).hexdigest()
+    
+    def cached_export(self, card_data, export_format, logo_path=None, img=None, profile=None,
+                      renderer=None, key=None):
+        """Return export bytes from the artifact store, rendering and storing them on a miss.
+
+        Hits are memoryviews of the mapped store. ``renderer`` (e.g. a render
+        pool client) renders misses instead of this generator.
+        """
+        key = key or self.export_key(card_data, export_format, logo_path, profile)
+        data = self.artifact_store.get(key)
+        if data is None:
+            data = (renderer or self).export_bytes(card_data, export_format, logo_path, img=img, profile=profile)
+            self.artifact_store.put(key, data)
+        return data
+    
+    def store_artifact(self, card_data, export_format, profile, artifact, layout=None, compact=True):
+        """Render a batch card and put it in the artifact store under ``artifact``"""
+        img = layout.render(card_data) if layout is not None else None
+        self.artifact_store.put(artifact, self.export_bytes(card_data, export_format, img=img, profile=profile),
+                                compact=compact)
+    
+    def render_png(self, card_data, logo_path=None, img=None, profile='print'):
+        """Render high resolution export bytes (PNG unless the profile says otherwise)"""
         try:
-            img = self.create_card_image(card_data, logo_path)
+            if img is None:
+                img = self.create_card_image(card_data, logo_path)
             
-            # High resolution for export
-            high_res_img = img.resize((self.card_width * 3, self.card_height * 3), 
+            # High resolution for export; 300 dpi is three times the card size
+            scale = self.dpi / 100
+            high_res_img = img.resize((round(self.card_width * scale), round(self.card_height * scale)), 
                                     Image.Resampling.LANCZOS)
             
-            export_filename = f"business_card_{uuid.uuid4().hex}.png"
-            export_path = os.path.join('exports', export_filename)
-            high_res_img.save(export_path, 'PNG', dpi=(self.dpi, self.dpi))
-            
-            return export_path
+            # Flat-color cards without a (possibly photographic) logo can be palettized
+            template = TEMPLATES.get(card_data.get('template', 'modern'))
+            flat = bool(template and template['flat'] and not logo_path)
+            return encode_image(high_res_img, profile, dpi=self.dpi, flat=flat)
         
         except Exception as e:
             logging.error(f"Error generating PNG: {str(e)}")
             raise
     
-    def generate_pdf(self, card_data, logo_path=None):
-        """Generate PDF export"""
+    def render_pdf(self, card_data, logo_path=None):
+        """Render PDF export bytes"""
         try:
-            export_filename = f"business_card_{uuid.uuid4().hex}.pdf"
-            export_path = os.path.join('exports', export_filename)
-            
-            c = canvas.Canvas(export_path, pagesize=letter)
+            buffer = io.BytesIO()
+            c = canvas.Canvas(buffer, pagesize=letter)
             
             # Convert business card dimensions to points (72 points = 1 inch)
             card_width_pt = (self.card_width / 96) * 72  # Assuming 96 DPI
@@ -454,8 +269,11 @@ class CardGenerator:
             
             # Get color scheme
             color_scheme = self.get_color_scheme(card_data.get('color', 'blue'))
-            primary_rgb = self._hex_to_rgb(color_scheme['primary'])
-            primary_color = colors.Color(int(primary_rgb[0])/255.0, int(primary_rgb[1])/255.0, int(primary_rgb[2])/255.0, alpha=1)
+            primary_color = color_scheme['primary_pdf']
+            
+            # Template decoration as vector paths
+            draw = self._apply_pdf_styling(c, card_data.get('template', 'modern'), color_scheme,
+                                           x_offset, y_offset, card_width_pt / self.card_width)
             
             # Draw text
             text_x = x_offset + 20
@@ -486,17 +304,7 @@ class CardGenerator:
             c.setFillColor(colors.black)
             c.setFont("Helvetica", 10)
             
-            contact_info = []
-            if card_data.get('email'):
-                contact_info.append(f"Email: {card_data['email']}")
-            if card_data.get('phone'):
-                contact_info.append(f"Phone: {card_data['phone']}")
-            if card_data.get('website'):
-                contact_info.append(f"Web: {card_data['website']}")
-            if card_data.get('address'):
-                contact_info.append(f"Address: {card_data['address']}")
-            
-            for info in contact_info:
+            for info in normalize_contact(card_data).contact_lines:
                 c.drawString(text_x, text_y, info)
                 text_y -= 15
             
@@ -515,21 +323,22 @@ class CardGenerator:
                 except Exception as e:
                     logging.error(f"Error adding logo to PDF: {str(e)}")
             
+            self._draw_pdf_qr(draw, card_data)
+            
             c.save()
-            return export_path
+            return buffer.getvalue()
         
         except Exception as e:
             logging.error(f"Error generating PDF: {str(e)}")
             raise
     
-    def generate_print_pdf(self, card_data, logo_path=None):
-        """Generate print-ready PDF with enhanced settings"""
+    def render_print_pdf(self, card_data, logo_path=None):
+        """Render print-ready PDF bytes"""
         try:
-            export_filename = f"business_card_print_{uuid.uuid4().hex}.pdf"
-            export_path = os.path.join('exports', export_filename)
+            buffer = io.BytesIO()
             
             # Use high-resolution settings for print
-            c = canvas.Canvas(export_path, pagesize=letter)
+            c = canvas.Canvas(buffer, pagesize=letter)
             
             # Set high-quality print settings
             c.setPageCompression(1)  # Enable compression
@@ -561,8 +370,9 @@ class CardGenerator:
             
             # Continue with standard PDF generation
             color_scheme = self.get_color_scheme(card_data.get('color', 'blue'))
-            primary_rgb = self._hex_to_rgb(color_scheme['primary'])
-            primary_color = colors.Color(int(primary_rgb[0])/255.0, int(primary_rgb[1])/255.0, int(primary_rgb[2])/255.0, alpha=1)
+            primary_color = color_scheme['primary_pdf']
+            draw = self._apply_pdf_styling(c, card_data.get('template', 'modern'), color_scheme,
+                                           x_offset, y_offset, card_width_pt / self.card_width)
             
             # Use larger fonts for print
             text_x = x_offset + 30
@@ -590,29 +400,21 @@ class CardGenerator:
             c.setFillColor(colors.black)
             c.setFont("Helvetica", 12)
             
-            contact_info = []
-            if card_data.get('email'):
-                contact_info.append(f"Email: {card_data['email']}")
-            if card_data.get('phone'):
-                contact_info.append(f"Phone: {card_data['phone']}")
-            if card_data.get('website'):
-                contact_info.append(f"Web: {card_data['website']}")
-            if card_data.get('address'):
-                contact_info.append(f"Address: {card_data['address']}")
-            
-            for info in contact_info:
+            for info in normalize_contact(card_data).contact_lines:
                 c.drawString(text_x, text_y, info)
                 text_y -= 20
             
+            self._draw_pdf_qr(draw, card_data)
+            
             c.save()
-            return export_path
+            return buffer.getvalue()
             
         except Exception as e:
             logging.error(f"Error generating print PDF: {str(e)}")
             raise
     
-    def generate_animated_html(self, card_data, logo_path=None):
-        """Generate animated HTML business card"""
+    def render_animated_html(self, card_data, logo_path=None):
+        """Render animated HTML business card bytes"""
         try:
             color_scheme = self.get_color_scheme(card_data.get('color', 'blue'))
             
@@ -635,7 +437,7 @@ class CardGenerator:
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Digital Business Card - {card_data.get('name', 'Business Card')}</title>
+    <title>Digital Business Card - {escape(card_data.get('name', 'Business Card'))}</title>
     <style>
         @import url('https://fonts.googleapis.com/css2?family=Roboto:wght@300;400;700&display=swap');
         
@@ -770,97 +572,795 @@ class CardGenerator:
 <body>
     <div class="business-card">
         {"<img src='" + logo_data_url + "' alt='Company Logo' class='logo'>" if logo_data_url else ""}
-        <div class="name">{card_data.get('name', '')}</div>
-        <div class="job-title">{card_data.get('job_title', '')}</div>
-        <div class="company">{card_data.get('company', '')}</div>
+        <div class="name">{escape(card_data.get('name', ''))}</div>
+        <div class="job-title">{escape(card_data.get('job_title', ''))}</div>
+        <div class="company">{escape(card_data.get('company', ''))}</div>
         <div class="contact-info">
 """
             
-            if card_data.get('email'):
-                html_content += f"            <div>Email: {card_data['email']}</div>\n"
-            if card_data.get('phone'):
-                html_content += f"            <div>Phone: {card_data['phone']}</div>\n"
-            if card_data.get('website'):
-                html_content += f"            <div>Web: {card_data['website']}</div>\n"
-            if card_data.get('address'):
-                html_content += f"            <div>Address: {card_data['address']}</div>\n"
+            for info in normalize_contact(card_data).contact_lines:
+                html_content += f"            <div>{escape(info)}</div>\n"
             
             html_content += """        </div>
     </div>
 </body>
 </html>"""
             
-            export_filename = f"business_card_{uuid.uuid4().hex}.html"
-            export_path = os.path.join('exports', export_filename)
-            
-            with open(export_path, 'w', encoding='utf-8') as f:
-                f.write(html_content)
-            
-            return export_path
+            return html_content.encode('utf-8')
         
         except Exception as e:
             logging.error(f"Error generating HTML: {str(e)}")
             raise
     
-    def generate_batch(self, csv_data, template, font, color, export_format):
-        """Generate batch business cards from CSV data"""
+    def generate_batch(self, csv_data, template, font, color, export_format, image_profile='compact',
+                       archive_format='zip', job_id=None, delta=False, series=None,
+                       workers=0, output_path=None, progress=None):
+        """Generate batch business cards from CSV data.
+
+        ``csv_data`` is any iterable of CSV row dicts, e.g. a ``CsvSource``;
+        rows are consumed one at a time and mapped to ``CardRecord``s, then
+        normalized and content-hashed. Each unique card is rendered
+        once and repeated rows are written as references to the same bytes.
+        Cards already in the artifact store from an earlier batch are reused
+        without rendering. Finished rows are checkpointed in a ``BatchJob``
+        directory, so running the same ``job_id`` again resumes after the last
+        finished row. Rows that fail are listed in ``errors.csv`` instead of
+        aborting the batch.
+
+        Each row is compared with the previous batch of the same ``series``
+        (see ``BatchManifest``) for the same template, font, color and
+        format; with ``delta`` the archive only contains added
+        and changed cards, and ``changes.json`` lists what changed. The counts
+        are kept in ``last_batch_summary`` and ``summary.json``.
+
+        The ``vcf`` format writes one vCard per row plus ``contacts.vcf`` with
+        every unique contact in the archive, without rendering any images.
+
+        ``workers`` renders cards in that many processes instead of inline;
+        rows are still checkpointed in order. The archive is written to
+        ``output_path`` (a directory for the ``dir`` archive format) or to a
+        new file under ``exports``. ``progress`` is called with the number of
+        finished rows and the running summary after every row.
+
+        The batch's cards are pinned in the artifact store until the archive
+        is written. When a job resumes, rows that failed are retried, and
+        checkpointed rows whose cards were compacted away anyway (e.g. by
+        another process) are rendered again. A crashed render pool aborts
+        the run without checkpointing the affected rows.
+        """
+        pinned = set()
         try:
-            # Create temporary directory for batch files
-            with tempfile.TemporaryDirectory() as temp_dir:
-                batch_files = []
-                
+            # Everything shared by the rows is prepared once; each row only
+            # draws its own text and QR code onto a copy of the template layer
+            layout = None
+            if export_format == 'png' and not workers:
+                layout = self.prepare_layout(template, color, font)
+            mapper = None
+            rendered = {}
+            renders = {}
+            summary = {'rows': 0, 'unique': 0, 'deduplicated': 0, 'failed': 0, 'resumed': 0,
+                       'rendered': 0, 'added': 0, 'changed': 0, 'unchanged': 0, 'removed': 0}
+            manifest = BatchManifest(template, font, color, export_format, series)
+            job = BatchJob(job_id or uuid.uuid4().hex).open()
+            self.artifact_store.pin(pinned)
+            # Failed rows are retried, as are rows whose cards were compacted away
+            job.forget(row for row, entry in job.done.items() if entry['status'] == 'error'
+                       or artifact_key(entry['hash'], export_format, image_profile, self.dpi) not in self.artifact_store)
+            pool = None
+            if workers:
+                pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('forkserver'))
+            # Rows wait here until their card is in the store, so they are checkpointed in order
+            pending = deque()
+            finished = 0
+            
+            def finish(keep):
+                nonlocal finished
+                while pending and (len(pending) > keep or pending[0][1] is None or pending[0][1].done()):
+                    entry, future, row, submitted = pending.popleft()
+                    if future is not None:
+                        try:
+                            future.result()
+                            summary['rendered'] += submitted
+                        except (BrokenProcessPool, CancelledError):
+                            # Not the row's fault; it stays unrecorded so a resumed run renders it
+                            raise
+                        except Exception as e:
+                            logging.error(f"Error in batch row {entry['row'] + 1}: {str(e)}")
+                            entry = {'row': entry['row'], 'status': 'error', 'error': str(e), 'key': entry['key'],
+                                     'values': dict(row)}
+                    job.record(entry)
+                    finished += 1
+                    if progress:
+                        progress(finished, summary)
+            
+            try:
                 for i, row in enumerate(csv_data):
-                    # Map CSV columns to card data
-                    card_data = {
-                        'name': row.get('name', row.get('Name', '')),
-                        'job_title': row.get('job_title', row.get('Job Title', row.get('title', ''))),
-                        'company': row.get('company', row.get('Company', '')),
-                        'email': row.get('email', row.get('Email', '')),
-                        'phone': row.get('phone', row.get('Phone', '')),
-                        'website': row.get('website', row.get('Website', '')),
-                        'address': row.get('address', row.get('Address', '')),
-                        'template': template,
-                        'font': font,
-                        'color': color,
-                        'include_qr': True
-                    }
-                    
-                    # Generate card based on format
-                    if export_format == 'png':
-                        file_path = self.generate_png(card_data)
-                        new_filename = f"card_{i+1}_{card_data.get('name', 'unknown').replace(' ', '_')}.png"
-                    elif export_format == 'pdf':
-                        file_path = self.generate_pdf(card_data)
-                        new_filename = f"card_{i+1}_{card_data.get('name', 'unknown').replace(' ', '_')}.pdf"
-                    elif export_format == 'html':
-                        file_path = self.generate_animated_html(card_data)
-                        new_filename = f"card_{i+1}_{card_data.get('name', 'unknown').replace(' ', '_')}.html"
-                    else:
+                    if export_format not in ('png', 'pdf', 'html', 'vcf'):
                         continue
+                    summary['rows'] += 1
+                    key = None
+                    future = None
+                    submitted = False
                     
-                    # Copy to temp directory with proper name
-                    temp_file_path = os.path.join(temp_dir, new_filename)
-                    with open(file_path, 'rb') as src, open(temp_file_path, 'wb') as dst:
-                        dst.write(src.read())
-                    
-                    batch_files.append(temp_file_path)
-                    
-                    # Clean up original file
                     try:
-                        os.remove(file_path)
-                    except:
-                        pass
-                
-                # Create ZIP file
-                zip_filename = f"business_cards_batch_{uuid.uuid4().hex}.zip"
-                zip_path = os.path.join('exports', zip_filename)
-                
-                with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                    for file_path in batch_files:
-                        zipf.write(file_path, os.path.basename(file_path))
+                        # Map CSV columns to card data; header aliases are resolved once per file
+                        if mapper is None:
+                            mapper = ColumnMapper(row.keys())
+                        card_data = mapper.map(row, template=template, font=font, color=color, include_qr=True)
+                        key = manifest.row_key(card_data, i)
+                        
+                        entry = job.done.get(i)
+                        if entry is not None:
+                            # Finished in an earlier, interrupted run
+                            if entry['status'] == 'ok':
+                                rendered.setdefault(entry['hash'], entry['file'])
+                                pinned.add(artifact_key(entry['hash'], export_format, image_profile, self.dpi))
+                            summary['resumed'] += 1
+                            finished += 1
+                            continue
+                        
+                        new_filename = f"card_{i+1}_{(card_data['name'] or 'unknown').replace(' ', '_')}.{export_format}"
+                        content_hash = card_content_hash(card_data)
+                        future = renders.get(content_hash)
+                        if content_hash not in rendered:
+                            artifact = artifact_key(content_hash, export_format, image_profile, self.dpi)
+                            pinned.add(artifact)
+                            if artifact not in self.artifact_store:
+                                # vCards are not QR-encoded, so only the QR formats are capacity-checked
+                                validate_card(card_data, None if export_format == 'vcf' else self.build_vcard(card_data))
+                                if pool:
+                                    # Workers leave compaction to this process, which knows the pins
+                                    future = pool.submit(self.store_artifact, card_data, export_format,
+                                                         image_profile, artifact, None, False)
+                                    renders[content_hash] = future
+                                    submitted = True
+                                else:
+                                    self.store_artifact(card_data, export_format, image_profile, artifact, layout)
+                                    summary['rendered'] += 1
+                            rendered[content_hash] = new_filename
+                    except Exception as e:
+                        logging.error(f"Error in batch row {i + 1}: {str(e)}")
+                        pending.append(({'row': i, 'status': 'error', 'error': str(e), 'key': key,
+                                         'values': dict(row)}, None, row, False))
+                    else:
+                        pending.append(({'row': i, 'status': 'ok', 'file': new_filename, 'hash': content_hash,
+                                         'key': key, 'change': manifest.classify(key, content_hash)},
+                                        future, row, submitted))
+                    finish(workers * 2)
+                finish(0)
+            finally:
+                job.close()
+                if pool:
+                    # Every checkpointed row's card is stored; unfinished renders are redone on resume
+                    pool.shutdown(wait=False, cancel_futures=True)
+            
+            # Create the archive from the stored cards; already-compressed
+            # outputs are stored as-is
+            zip_path = output_path or archive_path('exports', 'business_cards_batch', archive_format)
+            changes = {'added': [], 'changed': [], 'removed': []}
+            
+            with ArchiveWriter(zip_path, archive_format) as zipf:
+                written = {}
+                contacts = []
+                for entry in job.entries():
+                    if entry['status'] != 'ok':
+                        summary['failed'] += 1
+                        continue
+                    summary[entry['change']] += 1
+                    if entry['change'] != 'unchanged':
+                        changes[entry['change']].append(entry['file'])
+                    elif delta:
+                        continue
+                    data = self.artifact_store.get(artifact_key(entry['hash'], export_format, image_profile, self.dpi))
+                    if data is not None and entry['hash'] in written:
+                        zipf.add_reference(entry['file'], written[entry['hash']], data)
+                        summary['deduplicated'] += 1
+                        continue
+                    if data is None:
+                        raise RuntimeError(f"Rendered card for {entry['file']} is missing from the artifact store; "
+                                           f"run the batch again to render it")
+                    zipf.add(entry['file'], data)
+                    if export_format == 'vcf':
+                        contacts.append(bytes(data))
+                    written[entry['hash']] = entry['file']
+                    summary['unique'] += 1
                 
-                return zip_path
+                changes['removed'] = manifest.removed(job.entries())
+                summary['removed'] = len(changes['removed'])
+                error_report = job.error_report()
+                if error_report:
+                    zipf.add('errors.csv', error_report)
+                if contacts:
+                    zipf.add('contacts.vcf', b''.join(contacts))
+                if delta:
+                    zipf.add('changes.json', json.dumps(changes, indent=2).encode('utf-8'))
+                zipf.add('summary.json', json.dumps(summary, indent=2).encode('utf-8'))
+            
+            manifest.save(job.entries())
+            job.remove()
+            self.last_batch_summary = summary
+            logging.info(f"Batch generated: {summary['rows']} rows, {summary['rendered']} rendered, "
+                         f"{summary['changed']} changed, {summary['added']} added, {summary['removed']} removed, "
+                         f"{summary['deduplicated']} deduplicated, {summary['failed']} failed, "
+                         f"{summary['resumed']} resumed")
+            return zip_path
         
         except Exception as e:
             logging.error(f"Error in batch generation: {str(e)}")
             raise
+        finally:
+            self.artifact_store.unpin(pinned)
+
+
+class CardLayout:
+    """Row-invariant card render state: template layer, fonts, colors and metrics.
+
+    Batches share one layout so each card only draws its own text, logo and
+    QR code onto a copy of the prepared template layer.
+    """
+    
+    def __init__(self, generator, template, color, font='Arial', text_align='left', text_fit='wrap'):
+        self.generator = generator
+        self.template = template
+        self.font = font
+        self.text_align = text_align
+        self.text_fit = text_fit if text_fit in FIT_MODES else 'wrap'
+        self.color_scheme = generator.get_color_scheme(color)
+        self.primary_color = self.color_scheme['primary_rgb']
+        self.secondary_color = self.color_scheme['secondary_rgb']
+        self.base = _template_layer(template, self.color_scheme['id'],
+                                    generator.card_width, generator.card_height)
+        self.font_large, self.font_medium, self.font_small = _load_fonts()
+        
+        # Calculate text positioning
+        self.x_offset = 20 if text_align == 'left' else generator.card_width // 2
+        self.y_start = 30
+        self.line_height = 25
+        self.max_text_width = generator.card_width - 40
+    
+    def _draw_text(self, draw, text, font, fill, y_pos, spacing, advance):
+        """Fit and draw a block of text; returns the y position after it"""
+        font, lines = fit_text(text, font, self.max_text_width, self.text_fit, _load_font)
+        for i, line in enumerate(lines):
+            if self.text_align == 'center':
+                x_pos = (self.generator.card_width - text_width(font, line)) // 2
+            else:
+                x_pos = self.x_offset
+            draw.text((x_pos, y_pos), line, fill=fill, font=font)
+            y_pos += advance if i == len(lines) - 1 else spacing
+        return y_pos
+    
+    def render(self, card_data, logo_path=None):
+        """Draw one card's text, logo and QR code onto a copy of the template layer"""
+        gen = self.generator
+        img = self.base.copy()
+        draw = ImageDraw.Draw(img)
+        font_large, font_medium, font_small = self.font_large, self.font_medium, self.font_small
+        line_height = self.line_height
+        
+        # Draw text elements
+        y_pos = self.y_start
+        
+        # Name (largest)
+        name = card_data.get('name', '')
+        if name and font_large:
+            y_pos = self._draw_text(draw, name, font_large, self.primary_color, y_pos,
+                                    line_height, line_height + 5)
+        
+        # Job title
+        job_title = card_data.get('job_title', '')
+        if job_title and font_medium:
+            y_pos = self._draw_text(draw, job_title, font_medium, 'black', y_pos,
+                                    line_height, line_height)
+        
+        # Company
+        company = card_data.get('company', '')
+        if company and font_medium:
+            y_pos = self._draw_text(draw, company, font_medium, self.secondary_color, y_pos,
+                                    line_height, line_height + 10)
+        
+        # Contact and social lines
+        contact = normalize_contact(card_data)
+        
+        for info in contact.contact_lines + contact.social_lines:
+            if font_small:
+                y_pos = self._draw_text(draw, info, font_small, 'black', y_pos, 18, 18)
+        
+        # Add logo if provided
+        if logo_path and os.path.exists(logo_path):
+            try:
+                stat = os.stat(logo_path)
+                logo = _logo_thumbnail(logo_path, stat.st_mtime_ns, stat.st_size, 60)
+                logo_x = gen.card_width - logo.width - 20
+                logo_y = 20
+                img.paste(logo, (logo_x, logo_y))
+            except Exception as e:
+                logging.error(f"Error adding logo: {str(e)}")
+        
+        # Add QR code if requested
+        if card_data.get('include_qr', False):
+            qr_img = gen._qr_thumbnail(card_data, 60)
+            if qr_img:
+                qr_x = gen.card_width - 80
+                qr_y = gen.card_height - 80
+                img.paste(qr_img, (qr_x, qr_y))
+        
+        return img
+
+
+def normalize_card_data(card_data):
+    """Return a canonical ``CardRecord`` with trimmed text and resolved defaults"""
+    text = {field: str(card_data.get(field) or '').strip() for field in CARD_TEXT_FIELDS}
+    social_media = {
+        platform: str(value).strip()
+        for platform, value in (card_data.get('social_media') or {}).items()
+        if value and str(value).strip()
+    }
+    return CardRecord(
+        social_media=social_media,
+        template=str(card_data.get('template') or 'modern'),
+        font=str(card_data.get('font') or 'Arial'),
+        color=str(card_data.get('color') or DEFAULT_COLOR),
+        text_align=str(card_data.get('text_align') or 'left'),
+        text_fit=str(card_data.get('text_fit') or 'wrap'),
+        include_qr=bool(card_data.get('include_qr', False)),
+        **text
+    )
+
+
+def run_batch(csv_data, **settings):
+    """Generate a batch in a new generator and return ``(path, summary)``, for executor processes"""
+    generator = CardGenerator()
+    path = generator.generate_batch(csv_data, **settings)
+    return path, generator.last_batch_summary
+
+
+# Per-process render caches. Cached images are shared between renders and
+# must only be copied or pasted from, never drawn on.
+
+@lru_cache(maxsize=None)
+def _load_fonts():
+    """Load the large, medium and small card fonts (fallback to default if not available)"""
+    try:
+        return (ImageFont.truetype("arial.ttf", 24),
+                ImageFont.truetype("arial.ttf", 16),
+                ImageFont.truetype("arial.ttf", 12))
+    except (OSError, IOError):
+        try:
+            return (ImageFont.load_default(),
+                    ImageFont.load_default(),
+                    ImageFont.load_default())
+        except (OSError, IOError):
+            return None, None, None
+
+
+@lru_cache(maxsize=None)
+def _load_font(size):
+    """Load the card font at an arbitrary size, used when shrinking text to fit"""
+    try:
+        return ImageFont.truetype("arial.ttf", size)
+    except (OSError, IOError):
+        try:
+            return ImageFont.load_default(size)
+        except TypeError:
+            return ImageFont.load_default()
+
+
+@lru_cache(maxsize=64)
+def _template_layer(template, color_id, width, height):
+    """Blank card with the template decoration applied"""
+    gen = CardGenerator()
+    gen.card_width, gen.card_height = width, height
+    img = Image.new('RGB', (width, height), 'white')
+    gen._apply_template_styling(ImageDraw.Draw(img), img, template, gen.get_color_scheme(color_id))
+    return img
+
+
+GALLERY_TILE_SIZE = (160, 96)
+
+
+@lru_cache(maxsize=4)
+def _gallery(version, profile):
+    """Template gallery sprite sheet for a registry version: (key, bytes, tile map)"""
+    width, height = GALLERY_TILE_SIZE
+    templates, colors = _registry['template_list'], _registry['color_list']
+    sheet = Image.new('RGB', (width * len(colors), height * len(templates)), 'white')
+    tiles = {}
+    for row, template in enumerate(templates):
+        tiles[template['id']] = {}
+        for column, color in enumerate(colors):
+            # Rendered at card size so fixed-size decoration keeps its proportions;
+            # bypasses the layer cache so a gallery render does not evict batch layers
+            layer = _template_layer.__wrapped__(template['id'], color['id'], 400, 240)
+            sheet.paste(layer.resize(GALLERY_TILE_SIZE, Image.Resampling.LANCZOS), (column * width, row * height))
+            tiles[template['id']][color['id']] = (column * width, row * height)
+    data = encode_image(sheet, profile)
+    tile_map = {'tile_width': width, 'tile_height': height,
+                'sheet_width': sheet.width, 'sheet_height': sheet.height, 'tiles': tiles}
+    return hashlib.sha256(data).hexdigest(), data, tile_map
+
+
+def _build_qr(vcard):
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=constants.ERROR_CORRECT_L,
+        box_size=10,
+        border=4,
+    )
+    qr.add_data(vcard)
+    qr.make(fit=True)
+    return qr
+
+
+def _make_qr_image(vcard):
+    return _build_qr(vcard).make_image(fill_color="black", back_color="white")
+
+
+@lru_cache(maxsize=256)
+def _qr_matrix(vcard):
+    """QR modules for a vCard payload, including the quiet zone, for vector output"""
+    return tuple(tuple(row) for row in _build_qr(vcard).get_matrix())
+
+
+@lru_cache(maxsize=256)
+def _qr_thumbnail(vcard, size):
+    """QR code for a vCard payload, resized for pasting onto a card"""
+    return _make_qr_image(vcard).get_image().resize((size, size), Image.Resampling.LANCZOS)
+
+
+@lru_cache(maxsize=32)
+def _logo_thumbnail(logo_path, mtime_ns, file_size, size):
+    """Logo image scaled to fit the card; keyed by file stat so edits invalidate it"""
+    logo = Image.open(logo_path)
+    logo.thumbnail((size, size), Image.Resampling.LANCZOS)
+    return logo
+
+
+def _hex_to_rgb(hex_color):
+    """Convert hex color to RGB tuple"""
+    hex_color = hex_color.lstrip('#')
+    return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
+
+
+class _PdfDraw:
+    """Draws template decoration as PDF vector paths.
+
+    Implements the subset of ``ImageDraw`` the template renderers use, mapping
+    card pixel coordinates (origin top left) onto a card-sized box on a
+    ReportLab canvas, so raster template renderers can draw PDFs unchanged.
+    """
+
+    def __init__(self, canvas, x, y, scale, card_height):
+        self.canvas = canvas
+        self.x = x
+        self.y = y
+        self.scale = scale
+        self.card_height = card_height
+
+    def _point(self, x, y):
+        return self.x + x * self.scale, self.y + (self.card_height - y) * self.scale
+
+    @staticmethod
+    def _color(color):
+        if isinstance(color, str):
+            return colors.toColor(color)
+        return Color(*(c / 255.0 for c in color[:3]))
+
+    def _style(self, fill, outline, width):
+        if fill is not None:
+            self.canvas.setFillColor(self._color(fill))
+        if outline is not None:
+            self.canvas.setStrokeColor(self._color(outline))
+            self.canvas.setLineWidth(width * self.scale)
+
+    def _box(self, xy, inset=0):
+        # PIL boxes include both corner pixels; outlines are drawn inside the box
+        (x0, y0), (x1, y1) = xy
+        left, top = self._point(x0 + inset, y0 + inset)
+        right, bottom = self._point(x1 + 1 - inset, y1 + 1 - inset)
+        return left, bottom, right, top
+
+    def rectangle(self, xy, fill=None, outline=None, width=1):
+        if fill is not None:
+            self._style(fill, None, width)
+            left, bottom, right, top = self._box(xy)
+            self.canvas.rect(left, bottom, right - left, top - bottom, stroke=0, fill=1)
+        if outline is not None:
+            self._style(None, outline, width)
+            left, bottom, right, top = self._box(xy, width / 2)
+            self.canvas.rect(left, bottom, right - left, top - bottom, stroke=1, fill=0)
+
+    def ellipse(self, xy, fill=None, outline=None, width=1):
+        if fill is not None:
+            self._style(fill, None, width)
+            self.canvas.ellipse(*self._box(xy), stroke=0, fill=1)
+        if outline is not None:
+            self._style(None, outline, width)
+            self.canvas.ellipse(*self._box(xy, width / 2), stroke=1, fill=0)
+
+    def line(self, xy, fill=None, width=1):
+        # Lines run through pixel centers
+        (x0, y0), (x1, y1) = xy
+        self._style(None, fill or 'black', width)
+        self.canvas.line(*self._point(x0 + 0.5, y0 + 0.5), *self._point(x1 + 0.5, y1 + 0.5))
+
+    def polygon(self, xy, fill=None, outline=None, width=1):
+        self._style(fill, outline, width)
+        path = self.canvas.beginPath()
+        path.moveTo(*self._point(*xy[0]))
+        for point in xy[1:]:
+            path.lineTo(*self._point(*point))
+        path.close()
+        self.canvas.drawPath(path, stroke=int(outline is not None), fill=int(fill is not None))
+
+    def vertical_gradient(self, top, bottom, top_color, bottom_color, width):
+        """Fill the full-width band from ``top`` to ``bottom`` with a PDF axial shading"""
+        left, bottom_pt, right, top_pt = self._box([(0, top), (width - 1, bottom - 1)])
+        self.canvas.saveState()
+        path = self.canvas.beginPath()
+        path.rect(left, bottom_pt, right - left, top_pt - bottom_pt)
+        self.canvas.clipPath(path, stroke=0, fill=0)
+        self.canvas.linearGradient(left, top_pt, left, bottom_pt,
+                                   (self._color(top_color), self._color(bottom_color)), extend=False)
+        self.canvas.restoreState()
+
+    def qr_code(self, vcard, x, y, size):
+        """Draw a QR code as filled module runs in the ``size`` pixel square at ``x``, ``y``"""
+        matrix = _qr_matrix(vcard)
+        module = size / len(matrix)
+        self.canvas.setFillColor(white)
+        left, bottom, right, top = self._box([(x, y), (x + size - 1, y + size - 1)])
+        self.canvas.rect(left, bottom, right - left, top - bottom, stroke=0, fill=1)
+        self.canvas.setFillColor(black)
+        path = self.canvas.beginPath()
+        for row, cells in enumerate(matrix):
+            column = 0
+            while column < len(cells):
+                if not cells[column]:
+                    column += 1
+                    continue
+                start = column
+                while column < len(cells) and cells[column]:
+                    column += 1
+                run_left, run_top = self._point(x + start * module, y + row * module)
+                path.rect(run_left, run_top - module * self.scale,
+                          (column - start) * module * self.scale, module * self.scale)
+        self.canvas.drawPath(path, stroke=0, fill=1)
+
+
+# Template, font and color registries.
+#
+# Each registry maps an id to a read-only record and is built once at import.
+# The lists handed to the index page are rebuilt only when something is
+# registered, so request handlers never reconstruct them; ``version`` counts
+# registrations so derived data such as the template gallery can be rebuilt.
+_TEMPLATES = {}
+_TEMPLATE_RENDERERS = {}
+_TEMPLATE_PDF_RENDERERS = {}
+_FONTS = {}
+_COLOR_SCHEMES = {}
+_registry = {'template_list': (), 'font_list': (), 'color_list': (), 'version': 0}
+
+TEMPLATES = MappingProxyType(_TEMPLATES)
+FONTS = MappingProxyType(_FONTS)
+COLOR_SCHEMES = MappingProxyType(_COLOR_SCHEMES)
+DEFAULT_COLOR = 'blue'
+
+
+def register_template(template_id, name, description, renderer, flat=True, pdf_renderer=None):
+    """Register a card template.
+
+    ``renderer(generator, draw, img, color_scheme)`` draws the template
+    decoration onto a blank card. ``flat`` marks templates drawn only with
+    a few flat colors, which compact encoders may store as palette images.
+    PDF exports call ``renderer`` with a vector ``_PdfDraw`` and no image,
+    unless ``pdf_renderer(generator, draw, color_scheme)`` is given for
+    decoration that has a better vector form (e.g. gradients as shadings).
+    """
+    _TEMPLATES[template_id] = MappingProxyType({'id': template_id, 'name': name,
+                                                'description': description, 'flat': flat})
+    _TEMPLATE_RENDERERS[template_id] = renderer
+    _TEMPLATE_PDF_RENDERERS[template_id] = pdf_renderer
+    _template_layer.cache_clear()
+    _registry['template_list'] = tuple(_TEMPLATES.values())
+    _registry['version'] += 1
+
+
+def register_font(font_id, name):
+    """Register a selectable font"""
+    _FONTS[font_id] = MappingProxyType({'id': font_id, 'name': name})
+    _registry['font_list'] = tuple(_FONTS.values())
+    _registry['version'] += 1
+
+
+def register_color(color_id, name, primary, secondary):
+    """Register a color scheme with pre-parsed RGB and ReportLab colors"""
+    primary_rgb = _hex_to_rgb(primary)
+    secondary_rgb = _hex_to_rgb(secondary)
+    _COLOR_SCHEMES[color_id] = MappingProxyType({
+        'id': color_id,
+        'name': name,
+        'primary': primary,
+        'secondary': secondary,
+        'primary_rgb': primary_rgb,
+        'secondary_rgb': secondary_rgb,
+        'primary_pdf': Color(*(c / 255.0 for c in primary_rgb), alpha=1),
+        'secondary_pdf': Color(*(c / 255.0 for c in secondary_rgb), alpha=1),
+    })
+    _registry['color_list'] = tuple(_COLOR_SCHEMES.values())
+    _registry['version'] += 1
+    _template_layer.cache_clear()
+
+
+def _style_modern(gen, draw, img, scheme):
+    # Modern: Clean lines and accent border
+    draw.rectangle([(0, 0), (gen.card_width, 5)], fill=scheme['primary_rgb'])
+
+
+def _style_classic(gen, draw, img, scheme):
+    # Classic: Simple border
+    draw.rectangle([(0, 0), (gen.card_width-1, gen.card_height-1)], 
+                 outline='black', width=2)
+
+
+def _style_creative(gen, draw, img, scheme):
+    # Creative: Colorful background gradient effect
+    rgb = scheme['primary_rgb']
+    for i in range(gen.card_height):
+        draw.line([(0, i), (gen.card_width, i)], fill=rgb)
+
+
+def _pdf_creative(gen, draw, scheme):
+    # One filled rectangle instead of a line per pixel row
+    draw.rectangle([(0, 0), (gen.card_width - 1, gen.card_height - 1)], fill=scheme['primary_rgb'])
+
+
+def _style_elegant(gen, draw, img, scheme):
+    # Elegant: Subtle corner decorations
+    primary_color = scheme['primary_rgb']
+    draw.rectangle([(0, 0), (50, 5)], fill=primary_color)
+    draw.rectangle([(gen.card_width-50, gen.card_height-5), 
+                  (gen.card_width, gen.card_height)], fill=primary_color)
+
+
+def _style_tech(gen, draw, img, scheme):
+    # Tech: Geometric patterns
+    primary_color = scheme['primary_rgb']
+    draw.rectangle([(0, 0), (10, gen.card_height)], fill=primary_color)
+    for i in range(0, gen.card_width, 40):
+        draw.line([(i, 0), (i+20, 20)], fill=primary_color, width=1)
+
+
+def _style_corporate(gen, draw, img, scheme):
+    # Corporate: Professional double border
+    primary_color = scheme['primary_rgb']
+    draw.rectangle([(0, 0), (gen.card_width-1, gen.card_height-1)], 
+                 outline=primary_color, width=3)
+    draw.rectangle([(5, 5), (gen.card_width-6, gen.card_height-6)], 
+                 outline=primary_color, width=1)
+
+
+def _style_artistic(gen, draw, img, scheme):
+    # Artistic: Creative curved lines
+    rgb = scheme['primary_rgb']
+    for i in range(0, gen.card_width, 20):
+        x = i
+        y = int(20 * (1 + 0.5 * (i / gen.card_width)))
+        draw.ellipse([(x-10, y-10), (x+10, y+10)], outline=rgb, width=2)
+
+
+def _style_minimal(gen, draw, img, scheme):
+    # Minimal: Just a subtle line
+    draw.line([(20, gen.card_height-20), (gen.card_width-20, gen.card_height-20)], 
+             fill=scheme['primary_rgb'], width=1)
+
+
+def _style_bold(gen, draw, img, scheme):
+    # Bold: Strong geometric shapes
+    primary_color = scheme['primary_rgb']
+    draw.rectangle([(0, 0), (30, gen.card_height)], fill=primary_color)
+    draw.polygon([(30, 0), (60, 0), (30, 30)], fill=primary_color)
+
+
+def _style_vintage(gen, draw, img, scheme):
+    # Vintage: Ornate corner elements
+    rgb = scheme['primary_rgb']
+    # Top corners
+    for i in range(3):
+        draw.rectangle([(10+i*5, 10+i*2), (40-i*5, 12+i*2)], outline=rgb)
+        draw.rectangle([(gen.card_width-40+i*5, 10+i*2), 
+                      (gen.card_width-10-i*5, 12+i*2)], outline=rgb)
+
+
+def _style_geometric(gen, draw, img, scheme):
+    # Geometric: Modern shapes pattern
+    rgb = scheme['primary_rgb']
+    for i in range(0, gen.card_width, 60):
+        # Triangles
+        draw.polygon([(i, 0), (i+15, 0), (i+7, 15)], fill=rgb)
+        # Circles
+        draw.ellipse([(i+20, 5), (i+35, 20)], outline=rgb, width=2)
+
+
+def _style_gradient(gen, draw, img, scheme):
+    # Gradient: Smooth color transition
+    rgb = scheme['primary_rgb']
+    for i in range(gen.card_height):
+        opacity = int(255 * (1 - i / gen.card_height) * 0.3)
+        if opacity > 0:
+            color = tuple(min(255, c + opacity//3) for c in rgb)
+            draw.line([(0, i), (gen.card_width, i)], fill=color)
+
+
+def _pdf_gradient(gen, draw, scheme):
+    # Same colors as _style_gradient at its first and last rows, as one shading
+    rgb = scheme['primary_rgb']
+    top = tuple(min(255, c + int(255 * 0.3) // 3) for c in rgb)
+    draw.vertical_gradient(0, gen.card_height, top, rgb, gen.card_width)
+
+
+def _style_executive(gen, draw, img, scheme):
+    # Executive: Luxury gold-style accent
+    primary_color = scheme['primary_rgb']
+    draw.rectangle([(0, 0), (gen.card_width, 8)], fill=primary_color)
+    draw.rectangle([(0, gen.card_height-8), (gen.card_width, gen.card_height)], 
+                 fill=primary_color)
+    # Side accent
+    draw.rectangle([(gen.card_width-8, 0), (gen.card_width, gen.card_height)], 
+                 fill=primary_color)
+
+
+for _template in (
+    ('modern', 'Modern', 'Clean and minimalist design', _style_modern),
+    ('classic', 'Classic', 'Traditional business card layout', _style_classic),
+    ('creative', 'Creative', 'Bold and colorful design', _style_creative, True, _pdf_creative),
+    ('elegant', 'Elegant', 'Sophisticated and professional', _style_elegant),
+    ('tech', 'Tech', 'Modern technology-focused design', _style_tech),
+    ('corporate', 'Corporate', 'Professional business style', _style_corporate),
+    ('artistic', 'Artistic', 'Creative with artistic flair', _style_artistic),
+    ('minimal', 'Minimal', 'Ultra-clean simple design', _style_minimal),
+    ('bold', 'Bold', 'Strong visual impact design', _style_bold),
+    ('vintage', 'Vintage', 'Retro classic appearance', _style_vintage),
+    ('geometric', 'Geometric', 'Modern geometric patterns', _style_geometric),
+    ('gradient', 'Gradient', 'Smooth color transitions', _style_gradient, False, _pdf_gradient),
+    ('executive', 'Executive', 'Premium luxury design', _style_executive),
+):
+    register_template(*_template)
+
+for _font in (
+    ('Arial', 'Arial'),
+    ('Helvetica', 'Helvetica'),
+    ('Times', 'Times New Roman'),
+    ('Georgia', 'Georgia'),
+    ('Verdana', 'Verdana'),
+    ('Calibri', 'Calibri'),
+    ('Trebuchet', 'Trebuchet MS'),
+    ('Tahoma', 'Tahoma'),
+    ('Impact', 'Impact'),
+    ('Palatino', 'Palatino'),
+    ('Garamond', 'Garamond'),
+    ('Century', 'Century Gothic'),
+):
+    register_font(*_font)
+
+for _color in (
+    ('blue', 'Blue', '#007bff', '#6c757d'),
+    ('red', 'Red', '#dc3545', '#6c757d'),
+    ('green', 'Green', '#28a745', '#6c757d'),
+    ('purple', 'Purple', '#6f42c1', '#6c757d'),
+    ('orange', 'Orange', '#fd7e14', '#6c757d'),
+    ('black', 'Black', '#000000', '#6c757d'),
+    ('teal', 'Teal', '#20c997', '#6c757d'),
+    ('indigo', 'Indigo', '#6610f2', '#6c757d'),
+    ('pink', 'Pink', '#e83e8c', '#6c757d'),
+    ('yellow', 'Yellow', '#ffc107', '#495057'),
+    ('cyan', 'Cyan', '#17a2b8', '#6c757d'),
+    ('brown', 'Brown', '#8d4925', '#6c757d'),
+    ('navy', 'Navy', '#1e3a8a', '#64748b'),
+    ('emerald', 'Emerald', '#059669', '#6b7280'),
+    ('rose', 'Rose', '#e11d48', '#6b7280'),
+    ('amber', 'Amber', '#f59e0b', '#374151'),
+    ('violet', 'Violet', '#8b5cf6', '#6b7280'),
+    ('slate', 'Slate', '#475569', '#94a3b8'),
+):
+    register_color(*_color)
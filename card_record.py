@@ -0,0 +1,73 @@
+"""Compact card data record shared by single-card requests and batch rows."""
+import sys
+from collections.abc import Mapping
+from types import MappingProxyType
+
+CARD_TEXT_FIELDS = ('name', 'job_title', 'company', 'email', 'phone', 'website', 'address')
+CARD_SETTINGS = ('template', 'font', 'color', 'text_align', 'text_fit')
+
+_NO_SOCIAL_MEDIA = MappingProxyType({})
+
+
+class CardRecord(Mapping):
+    """Card text, social links and render settings held in slots.
+
+    Setting names are interned, so every record in a batch shares one copy of
+    each, and records without social links share one empty mapping. Records
+    are mappings, so renderers read them exactly like card data dicts.
+    """
+
+    __slots__ = CARD_TEXT_FIELDS + ('social_media',) + CARD_SETTINGS + ('include_qr',)
+
+    def __init__(self, name='', job_title='', company='', email='', phone='', website='', address='',
+                 social_media=None, template='modern', font='Arial', color='blue', text_align='left',
+                 text_fit='wrap', include_qr=False):
+        self.name = name
+        self.job_title = job_title
+        self.company = company
+        self.email = email
+        self.phone = phone
+        self.website = website
+        self.address = address
+        self.social_media = social_media or _NO_SOCIAL_MEDIA
+        self.template = sys.intern(template)
+        self.font = sys.intern(font)
+        self.color = sys.intern(color)
+        self.text_align = sys.intern(text_align)
+        self.text_fit = sys.intern(text_fit)
+        self.include_qr = include_qr
+
+    def __getitem__(self, key):
+        if key not in _FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self):
+        return iter(self.__slots__)
+
+    def __len__(self):
+        return len(self.__slots__)
+
+    def __reduce__(self):
+        # Slots are in __init__ argument order; rebuilding through __init__
+        # re-interns the settings in the receiving process
+        return CardRecord, tuple(self.to_dict().values())
+
+    def __repr__(self):
+        return f"CardRecord({self.to_dict()!r})"
+
+    def to_dict(self):
+        """Return the record as a plain, JSON-serializable dict"""
+        data = {field: getattr(self, field) for field in self.__slots__}
+        data['social_media'] = dict(self.social_media)
+        return data
+
+
+_FIELDS = frozenset(CardRecord.__slots__)
+
+
+def json_default(value):
+    """``json.dumps`` fallback that serializes card records and other mappings as dicts"""
+    if isinstance(value, Mapping):
+        return dict(value)
+    return str(value)
@@ -0,0 +1,237 @@
+import os
+import json
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from card_record import json_default
+
+
+class CardStore:
+    """Server-side store for card data and rendered artifacts.
+
+    Cards are keyed by a short content-derived id so the session cookie only
+    needs to carry that id. Recently used cards and their artifacts live in an
+    in-process LRU; an optional backend persists card data and byte artifacts
+    so other workers (and restarts) can serve exports without the original
+    request.
+    """
+
+    def __init__(self, capacity=128, backend=None):
+        self.capacity = capacity
+        self.backend = backend
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_card_id(card_data, logo_file=None):
+        """Derive a short id from the card content and logo file"""
+        payload = {'card_data': card_data, 'logo_file': logo_file}
+        if logo_file and os.path.exists(logo_file):
+            stat = os.stat(logo_file)
+            payload['logo_stat'] = [stat.st_size, stat.st_mtime_ns]
+        encoded = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=json_default).encode('utf-8')
+        return hashlib.sha1(encoded).hexdigest()[:16]
+
+    def put(self, card_data, logo_file=None):
+        """Store normalized card data and return its card id"""
+        card_id = self.make_card_id(card_data, logo_file)
+        with self._lock:
+            if card_id in self._entries:
+                self._entries.move_to_end(card_id)
+                return card_id
+            self._remember(card_id, {'card_data': card_data, 'logo_file': logo_file, 'artifacts': {}})
+        if self.backend:
+            try:
+                self.backend.save_card(card_id, card_data, logo_file)
+            except Exception as e:
+                logging.error(f"Error saving card to store backend: {str(e)}")
+        return card_id
+
+    def get(self, card_id):
+        """Return the stored entry for a card id, or None"""
+        if not card_id:
+            return None
+        with self._lock:
+            entry = self._entries.get(card_id)
+            if entry is not None:
+                self._entries.move_to_end(card_id)
+                return entry
+        if not self.backend:
+            return None
+        try:
+            record = self.backend.load_card(card_id)
+        except Exception as e:
+            logging.error(f"Error loading card from store backend: {str(e)}")
+            return None
+        if record is None:
+            return None
+        card_data, logo_file = record
+        entry = {'card_data': card_data, 'logo_file': logo_file, 'artifacts': {}}
+        with self._lock:
+            self._remember(card_id, entry)
+        return entry
+
+    def get_artifact(self, card_id, name):
+        """Return a cached render artifact for a card, or None"""
+        entry = self.get(card_id)
+        if entry is None:
+            return None
+        artifact = entry['artifacts'].get(name)
+        if artifact is None and self.backend:
+            try:
+                artifact = self.backend.load_artifact(card_id, name)
+            except Exception as e:
+                logging.error(f"Error loading artifact from store backend: {str(e)}")
+            if artifact is not None:
+                entry['artifacts'][name] = artifact
+        return artifact
+
+    def put_artifact(self, card_id, name, artifact):
+        """Cache a render artifact; byte artifacts are also persisted to the backend"""
+        entry = self.get(card_id)
+        if entry is None:
+            return
+        entry['artifacts'][name] = artifact
+        if self.backend and isinstance(artifact, bytes):
+            try:
+                self.backend.save_artifact(card_id, name, artifact)
+            except Exception as e:
+                logging.error(f"Error saving artifact to store backend: {str(e)}")
+
+    def _remember(self, card_id, entry):
+        self._entries[card_id] = entry
+        self._entries.move_to_end(card_id)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+
+class SQLiteCardBackend:
+    """Card store backend using a local SQLite database.
+
+    Cards older than ``max_age`` seconds, and the oldest cards beyond
+    ``max_cards``, are deleted with their artifacts. Saves check for expired
+    cards at most once every ``prune_interval`` seconds.
+    """
+
+    placeholder = '?'
+
+    def __init__(self, path, max_cards=10000, max_age=7 * 24 * 3600, prune_interval=60):
+        self.path = path
+        self.max_cards = max_cards
+        self.max_age = max_age
+        self.prune_interval = prune_interval
+        self._pruned_at = 0
+        self._local = threading.local()
+        self._create_tables()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        # WAL lets other workers read cards while one of them is writing
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _create_tables(self):
+        conn = self._connection()
+        with conn:
+            cur = conn.cursor()
+            cur.execute('CREATE TABLE IF NOT EXISTS cards '
+                        '(card_id TEXT PRIMARY KEY, card_data TEXT NOT NULL, logo_file TEXT, '
+                        'created_at DOUBLE PRECISION NOT NULL DEFAULT 0)')
+            cur.execute('CREATE TABLE IF NOT EXISTS card_artifacts '
+                        '(card_id TEXT NOT NULL, name TEXT NOT NULL, data BYTEA NOT NULL, '
+                        'PRIMARY KEY (card_id, name))')
+        try:
+            self._execute('SELECT created_at FROM cards LIMIT 1', ())
+        except Exception:
+            # Tables created before cards expired; existing cards are pruned first
+            self._execute('ALTER TABLE cards ADD COLUMN created_at DOUBLE PRECISION NOT NULL DEFAULT 0', ())
+        self._execute('CREATE INDEX IF NOT EXISTS cards_created_at ON cards (created_at)', ())
+
+    def _execute(self, sql, params):
+        conn = self._connection()
+        with conn:
+            cur = conn.cursor()
+            cur.execute(sql.replace('?', self.placeholder), params)
+            return cur.fetchone() if sql.startswith('SELECT') else None
+
+    def save_card(self, card_id, card_data, logo_file):
+        now = time.time()
+        self._execute('INSERT INTO cards (card_id, card_data, logo_file, created_at) VALUES (?, ?, ?, ?) '
+                      'ON CONFLICT (card_id) DO NOTHING',
+                      (card_id, json.dumps(card_data, default=json_default), logo_file, now))
+        if now - self._pruned_at >= self.prune_interval:
+            self._pruned_at = now
+            self.prune(now)
+
+    def prune(self, now=None):
+        """Delete expired cards, and the oldest cards beyond ``max_cards``, with their artifacts"""
+        if self.max_age:
+            self._execute('DELETE FROM cards WHERE created_at < ?', ((now or time.time()) - self.max_age,))
+        if self.max_cards:
+            self._execute('DELETE FROM cards WHERE created_at < (SELECT created_at FROM cards '
+                          'ORDER BY created_at DESC LIMIT 1 OFFSET ?)', (self.max_cards - 1,))
+        self._execute('DELETE FROM card_artifacts WHERE card_id NOT IN (SELECT card_id FROM cards)', ())
+
+    def load_card(self, card_id):
+        row = self._execute('SELECT card_data, logo_file FROM cards WHERE card_id = ?', (card_id,))
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def save_artifact(self, card_id, name, data):
+        self._execute('INSERT INTO card_artifacts (card_id, name, data) VALUES (?, ?, ?) '
+                      'ON CONFLICT (card_id, name) DO UPDATE SET data = excluded.data',
+                      (card_id, name, data))
+
+    def load_artifact(self, card_id, name):
+        row = self._execute('SELECT data FROM card_artifacts WHERE card_id = ? AND name = ?',
+                            (card_id, name))
+        return bytes(row[0]) if row is not None else None
+
+
+class PostgresCardBackend(SQLiteCardBackend):
+    """Card store backend using PostgreSQL via psycopg2"""
+
+    placeholder = '%s'
+
+    def __init__(self, dsn, max_cards=10000, max_age=7 * 24 * 3600, prune_interval=60):
+        import psycopg2
+        self._psycopg2 = psycopg2
+        self.dsn = dsn
+        self.max_cards = max_cards
+        self.max_age = max_age
+        self.prune_interval = prune_interval
+        self._pruned_at = 0
+        self._local = threading.local()
+        self._create_tables()
+
+    def _connect(self):
+        return self._psycopg2.connect(self.dsn)
+
+
+def create_card_store(url=None, capacity=128, max_cards=10000, max_age=7 * 24 * 3600):
+    """Create a card store from a backend URL.
+
+    ``sqlite:///path/to/cards.db`` and ``postgresql://...`` select a
+    persistent backend that keeps at most ``max_cards`` cards for up to
+    ``max_age`` seconds (0 disables either limit); an empty URL keeps cards
+    in process memory only.
+    """
+    backend = None
+    if url:
+        if url.startswith('sqlite:///'):
+            backend = SQLiteCardBackend(url[len('sqlite:///'):], max_cards, max_age)
+        elif url.startswith(('postgres://', 'postgresql://')):
+            backend = PostgresCardBackend(url, max_cards, max_age)
+        else:
+            raise ValueError(f"Unsupported card store URL: {url}")
+    return CardStore(capacity=capacity, backend=backend)
@@ -0,0 +1,105 @@
+"""Generate a batch of business cards from the command line.
+
+Reads CSV from a file or stdin and writes the batch archive, or a directory
+of card files, without going through the web app:
+
+    python cli.py contacts.csv -o cards.zip [--format png] [--workers 4] [--resume]
+    cat contacts.csv | python cli.py - -o cards/ --archive dir --format vcf
+
+Running the same input and settings again with ``--resume`` continues an
+interrupted run instead of starting over. The exit status is 1 when any
+row failed; failed rows are listed in ``errors.csv`` in the output.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+from archive import ARCHIVE_FORMATS, DIRECTORY
+from batch import BatchJob, CsvSource, make_job_id
+from card_generator import CardGenerator
+from encoders import ENCODER_PROFILES
+
+
+class Progress:
+    """Report finished rows and throughput on stderr, at most every ``interval`` seconds"""
+
+    def __init__(self, interval=1.0, stream=sys.stderr):
+        self.interval = interval
+        self.stream = stream
+        self.started = time.perf_counter()
+        self._reported = 0
+
+    def __call__(self, finished, summary):
+        now = time.perf_counter()
+        if now - self._reported < self.interval:
+            return
+        self._reported = now
+        elapsed = now - self.started
+        self.stream.write(f"\r{finished} rows, {summary['rendered']} rendered "
+                          f"({finished / elapsed:.1f} rows/s, {summary['rendered'] / elapsed:.1f} renders/s)")
+        self.stream.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('input', help="CSV file, or '-' for stdin")
+    parser.add_argument('-o', '--output', required=True, help='archive file, or directory with --archive dir')
+    parser.add_argument('--format', default='png', choices=('png', 'pdf', 'html', 'vcf'), help='card format')
+    parser.add_argument('--archive', default='zip', choices=(*ARCHIVE_FORMATS, DIRECTORY), help='output type')
+    parser.add_argument('--template', default='modern', help='card template')
+    parser.add_argument('--font', default='Arial', help='font style')
+    parser.add_argument('--color', default='blue', help='color scheme')
+    parser.add_argument('--profile', default=os.environ.get('BATCH_ENCODER', 'compact'), choices=ENCODER_PROFILES,
+                        help='encoder profile for PNG cards')
+    parser.add_argument('--dpi', type=int, default=300, help='PNG resolution')
+    parser.add_argument('--workers', type=int, default=0, help='render processes (0 renders inline)')
+    parser.add_argument('--series', help='name of this list; batches of a series are compared with the last one')
+    parser.add_argument('--delta', action='store_true', help='only write cards changed since the last batch of --series')
+    parser.add_argument('--resume', action='store_true', help='continue an interrupted run of the same input')
+    parser.add_argument('-q', '--quiet', action='store_true', help='no progress output')
+    args = parser.parse_args(argv)
+    if args.delta and not args.series:
+        parser.error('--delta needs --series')
+
+    logging.basicConfig(level=logging.WARNING)
+    if args.input == '-':
+        raw = sys.stdin.buffer.read()
+    else:
+        with open(args.input, 'rb') as f:
+            raw = f.read()
+    csv_data = CsvSource(raw.decode('utf-8-sig', errors='surrogateescape'))
+
+    settings = {
+        'template': args.template,
+        'font': args.font,
+        'color': args.color,
+        'export_format': args.format,
+        'archive_format': args.archive,
+        'delta': args.delta,
+        'series': f"cli/{args.series}" if args.series else None,
+    }
+    job_id = make_job_id(raw, dict(settings, profile=args.profile, dpi=args.dpi))
+    if not args.resume:
+        BatchJob(job_id).remove()
+
+    progress = None if args.quiet else Progress()
+    started = time.perf_counter()
+    generator = CardGenerator(dpi=args.dpi)
+    generator.generate_batch(csv_data, image_profile=args.profile, job_id=job_id, workers=args.workers,
+                             output_path=args.output, progress=progress, **settings)
+    elapsed = time.perf_counter() - started
+
+    summary = generator.last_batch_summary
+    if progress:
+        sys.stderr.write('\n')
+    sys.stderr.write(f"{summary['rows']} rows in {elapsed:.1f}s ({summary['rows'] / elapsed:.1f} rows/s), "
+                     f"{summary['rendered']} rendered, {summary['failed']} failed -> {args.output}\n")
+    json.dump(summary, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""Contact normalization shared by every exporter.
+
+A card's contact fields and social links are normalized once into a
+``Contact``: the vCard payload used for QR codes and ``.vcf`` exports, and
+the labelled lines drawn on raster, PDF and HTML cards. Social platforms are
+described by ``SOCIAL_PLATFORMS`` instead of per-exporter branches.
+"""
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+# label: display label; url: profile URL template for bare handles, or None to
+# only link full URLs; strip: URL prefix removed for display, replaced by
+# ``replacement``; handle: display as an @handle
+SocialPlatform = namedtuple('SocialPlatform', 'label url strip replacement handle')
+
+SOCIAL_PLATFORMS = {
+    'linkedin': SocialPlatform('LinkedIn:', None,
+                               re.compile(r'^https?://(www\.)?linkedin\.com/in/'), 'in/', False),
+    'twitter': SocialPlatform('Twitter:', 'https://twitter.com/{}',
+                              re.compile(r'^https?://(www\.)?(twitter|x)\.com/'), '', True),
+    'instagram': SocialPlatform('Instagram:', 'https://instagram.com/{}',
+                                re.compile(r'^https?://(www\.)?instagram\.com/'), '', True),
+    'github': SocialPlatform('GitHub:', 'https://github.com/{}',
+                             re.compile(r'^(https?://)?(www\.)?github\.com/'), '', False),
+    'facebook': SocialPlatform('Facebook:', 'https://facebook.com/{}',
+                               re.compile(r'^https?://(www\.)?facebook\.com/'), '', False),
+    'tiktok': SocialPlatform('TikTok:', 'https://tiktok.com/@{}',
+                             re.compile(r'^https?://(www\.)?tiktok\.com/@?'), '', True),
+}
+OTHER_PLATFORM = SocialPlatform('Social:', None, None, '', False)
+
+CONTACT_LABELS = (('email', 'Email:'), ('phone', 'Phone:'), ('website', 'Web:'), ('address', 'Address:'))
+
+Contact = namedtuple('Contact', 'vcard contact_lines social_lines')
+
+_VCARD_ESCAPES = str.maketrans({'\\': '\\\\', ';': '\\;', ',': '\\,', '\n': '\\n'})
+
+
+def vcard_escape(value):
+    """Escape a vCard text value (RFC 6350 section 3.4)"""
+    return value.replace('\r\n', '\n').translate(_VCARD_ESCAPES)
+
+
+def vcard_name(name):
+    """Structured ``N`` value (family;given;additional;prefix;suffix) for a full name.
+
+    Text after a comma is the suffix ("Ann Lee, PhD"); of the rest, the last
+    word is the family name and the words before it the given names. A single
+    word is used as the given name.
+    """
+    name, _, suffix = name.partition(',')
+    given, _, family = name.strip().rpartition(' ')
+    if not given:
+        given, family = family, ''
+    return f"{vcard_escape(family)};{vcard_escape(given.strip())};;;{vcard_escape(suffix.strip())}"
+
+
+def social_url(platform, value):
+    """Profile URL for a social link, or None if the platform has no URL form for it"""
+    if value.startswith('http'):
+        return value
+    spec = SOCIAL_PLATFORMS.get(platform, OTHER_PLATFORM)
+    if spec.url is None:
+        return None
+    return spec.url.format(value.lstrip('@') if spec.handle else value)
+
+
+def social_display(platform, value):
+    """Short form of a social link drawn on the card"""
+    spec = SOCIAL_PLATFORMS.get(platform, OTHER_PLATFORM)
+    if spec.strip is not None:
+        value = spec.strip.sub(spec.replacement, value)
+    if spec.handle and not value.startswith('@'):
+        value = f"@{value}"
+    return value
+
+
+def normalize_contact(card_data):
+    """Return the cached ``Contact`` for a card's contact fields and social links"""
+    social_media = card_data.get('social_media') or {}
+    return _normalize(card_data.get('name', ''), card_data.get('company', ''),
+                      card_data.get('job_title', ''), card_data.get('email', ''),
+                      card_data.get('phone', ''), card_data.get('website', ''),
+                      card_data.get('address', ''), tuple(social_media.items()))
+
+
+@lru_cache(maxsize=1024)
+def _normalize(name, company, job_title, email, phone, website, address, social):
+    fields = {'email': email, 'phone': phone, 'website': website, 'address': address}
+    vcard_lines = [
+        "BEGIN:VCARD",
+        "VERSION:3.0",
+        f"FN:{vcard_escape(name)}",
+        f"N:{vcard_name(name)}",
+        f"ORG:{vcard_escape(company)}",
+        f"TITLE:{vcard_escape(job_title)}",
+        f"EMAIL:{email}",
+        f"TEL:{phone}",
+        f"URL:{website}",
+    ]
+    social_lines = []
+    for platform, value in social:
+        if not value:
+            continue
+        url = social_url(platform, value)
+        if url:
+            vcard_lines.append(f"URL:{url}")
+        label = SOCIAL_PLATFORMS.get(platform, OTHER_PLATFORM).label
+        social_lines.append(f"{label} {social_display(platform, value)}")
+    vcard_lines.extend([f"ADR:;;{vcard_escape(address)};;;;", "END:VCARD"])
+    contact_lines = tuple(f"{label} {fields[field]}" for field, label in CONTACT_LABELS if fields[field])
+    return Contact('\n'.join(vcard_lines), contact_lines, tuple(social_lines))
+
+
+def render_vcard(card_data):
+    """Return a card as a standalone ``.vcf`` file (CRLF line endings, UTF-8)"""
+    return (normalize_contact(card_data).vcard.replace('\n', '\r\n') + '\r\n').encode('utf-8')
@@ -0,0 +1,213 @@
+"""Shared render pool for multi-worker serving.
+
+Run ``python render_pool.py`` next to gunicorn and set ``RENDER_POOL_ADDRESS``
+for the web workers. Render processes own the font, template-layer, QR and
+logo caches; jobs prefer a process chosen by template, color and font so each
+process mostly caches its own share of the combinations, and go to the least
+busy process instead when that one already has work queued. Rendered bytes come
+back through shared memory instead of being pickled over the socket.
+
+The manager protocol unpickles requests, so the pool only listens on a TCP
+address with an explicit ``RENDER_POOL_AUTHKEY`` (or ``SESSION_SECRET``);
+unix sockets are created readable by the owner only.
+"""
+import os
+import zlib
+import logging
+import argparse
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+from multiprocessing.managers import BaseManager
+
+DEFAULT_ADDRESS = '/tmp/card-render.sock'
+DEV_AUTHKEY = 'dev-secret-key-change-in-production'
+
+# Seconds a result block may wait for its client before the pool unlinks it
+RESULT_TTL = 300
+
+
+def _authkey(address):
+    """Manager auth key; the development key is only accepted for unix sockets"""
+    key = os.environ.get('RENDER_POOL_AUTHKEY') or os.environ.get('SESSION_SECRET')
+    if key:
+        return key.encode('utf-8')
+    if isinstance(address, tuple):
+        logging.error(f"Render pool on {address[0]}:{address[1]} needs RENDER_POOL_AUTHKEY or SESSION_SECRET")
+        raise ValueError('Set RENDER_POOL_AUTHKEY or SESSION_SECRET to use a TCP render pool address')
+    return DEV_AUTHKEY.encode('utf-8')
+
+
+def _unlink_block(name):
+    try:
+        shm = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
+
+
+def _parse_address(address):
+    """Return a manager address: ``host:port`` for TCP, anything else is a unix socket path"""
+    host, sep, port = address.rpartition(':')
+    if sep and port.isdigit():
+        return (host or '127.0.0.1', int(port))
+    return address
+
+
+_generator = None
+
+
+def _render_job(export_format, card_data, logo_path, profile=None):
+    """Render in a pool process and hand the bytes back in a shared memory block"""
+    global _generator
+    if _generator is None:
+        from card_generator import CardGenerator
+        _generator = CardGenerator()
+    data = _generator.export_bytes(card_data, export_format, logo_path, profile=profile)
+    shm = shared_memory.SharedMemory(create=True, size=max(len(data), 1))
+    try:
+        shm.buf[:len(data)] = data
+    except BaseException:
+        shm.close()
+        shm.unlink()
+        raise
+    # The client unlinks the block once it has copied the bytes out
+    resource_tracker.unregister(shm._name, 'shared_memory')
+    name = shm.name
+    shm.close()
+    return name, len(data)
+
+
+class RenderPool:
+    """Render processes with cache affinity by template, color and font.
+
+    Affinity is only a preference: a job goes to its preferred process unless
+    another one has fewer jobs in flight, so renders of one popular
+    combination still spread over every core. Result blocks a client never
+    collected, e.g. because it disconnected, are unlinked after
+    ``RESULT_TTL`` seconds.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self._shards = [ProcessPoolExecutor(max_workers=1) for _ in range(self.workers)]
+        self._in_flight = [0] * self.workers
+        self._results = {}
+        self._lock = threading.Lock()
+
+    def _acquire(self, card_data):
+        key = f"{card_data.get('template')}|{card_data.get('color')}|{card_data.get('font')}"
+        preferred = zlib.crc32(key.encode('utf-8')) % self.workers
+        with self._lock:
+            index = min(range(self.workers), key=lambda i: (self._in_flight[i], i != preferred))
+            self._in_flight[index] += 1
+        return index
+
+    def _expire_results(self, now):
+        # Results are recorded in the order they finished, so the oldest come first
+        expired = []
+        with self._lock:
+            for name, created in self._results.items():
+                if now - created <= RESULT_TTL:
+                    break
+                expired.append(name)
+            for name in expired:
+                del self._results[name]
+        for name in expired:
+            _unlink_block(name)
+
+    def render(self, export_format, card_data, logo_path=None, profile=None):
+        now = time.monotonic()
+        self._expire_results(now)
+        index = self._acquire(card_data)
+        try:
+            name, size = self._shards[index].submit(_render_job, export_format, card_data,
+                                                    logo_path, profile).result()
+        finally:
+            with self._lock:
+                self._in_flight[index] -= 1
+        with self._lock:
+            self._results[name] = now
+        return name, size
+
+    def shutdown(self):
+        for shard in self._shards:
+            shard.shutdown()
+        for name in list(self._results):
+            _unlink_block(name)
+
+
+class _PoolManager(BaseManager):
+    pass
+
+
+class RenderPoolClient:
+    """Client used by web workers; mirrors ``CardGenerator.export_bytes``"""
+
+    def __init__(self, address):
+        self.address = _parse_address(address)
+        self._proxy = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        # Connect lazily so each forked web worker gets its own connection
+        with self._lock:
+            if self._proxy is None or self._pid != os.getpid():
+                _PoolManager.register('render_pool')
+                manager = _PoolManager(address=self.address, authkey=_authkey(self.address))
+                manager.connect()
+                self._proxy = manager.render_pool()
+                self._pid = os.getpid()
+            return self._proxy
+
+    def export_bytes(self, card_data, export_format, logo_path=None, img=None, profile=None):
+        """Render an export format in the pool; ``img`` is ignored"""
+        if logo_path:
+            logo_path = os.path.abspath(logo_path)
+        name, size = self._pool().render(export_format, card_data, logo_path, profile)
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            return bytes(shm.buf[:size])
+        finally:
+            shm.close()
+            shm.unlink()
+
+
+def create_render_client(address=None):
+    """Return a pool client when ``RENDER_POOL_ADDRESS`` is set, otherwise None"""
+    address = address or os.environ.get('RENDER_POOL_ADDRESS')
+    if not address:
+        return None
+    return RenderPoolClient(address)
+
+
+def serve(address, workers=None):
+    parsed = _parse_address(address)
+    authkey = _authkey(parsed)
+    pool = RenderPool(workers)
+    _PoolManager.register('render_pool', callable=lambda: pool)
+    manager = _PoolManager(address=parsed, authkey=authkey)
+    server = manager.get_server()
+    if isinstance(parsed, str):
+        os.chmod(parsed, 0o600)
+    logging.info(f"Render pool with {pool.workers} processes listening on {address}")
+    try:
+        server.serve_forever()
+    finally:
+        pool.shutdown()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Run the shared business card render pool')
+    parser.add_argument('--address', default=os.environ.get('RENDER_POOL_ADDRESS', DEFAULT_ADDRESS),
+                        help='unix socket path or host:port to listen on')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of render processes (default: CPU count)')
+    args = parser.parse_args()
+    if isinstance(_parse_address(args.address), str) and os.path.exists(args.address):
+        os.remove(args.address)
+    serve(args.address, args.workers)
@@ -0,0 +1,95 @@
+"""Cached text measurement and fitting for card layouts.
+
+Measurements are memoized per (font, size, text) for the life of the process,
+so centered text and fitted lines cost a dictionary lookup when the same card
+is rendered again for preview and export, and batches re-measure only the
+text that differs between rows.
+"""
+from functools import lru_cache
+
+FIT_MODES = ('wrap', 'truncate', 'shrink')
+ELLIPSIS = '...'
+MIN_FONT_SIZE = 8
+
+
+@lru_cache(maxsize=16384)
+def _text_width(font, size, text):
+    bbox = font.getbbox(text)
+    return bbox[2] - bbox[0]
+
+
+def text_width(font, text):
+    """Return the rendered width of a single line of text"""
+    return _text_width(font, getattr(font, 'size', None), text)
+
+
+def _longest_fitting_prefix(text, font, max_width, suffix=''):
+    """Length of the longest prefix of ``text`` that fits with ``suffix`` appended"""
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if text_width(font, text[:mid].rstrip() + suffix) <= max_width:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+
+def wrap_text(text, font, max_width):
+    """Greedy word wrap; words wider than the line are broken between characters"""
+    lines = []
+    current = ''
+    for word in text.split(' '):
+        candidate = f"{current} {word}" if current else word
+        if text_width(font, candidate) <= max_width:
+            current = candidate
+            continue
+        if current:
+            lines.append(current)
+        while word and text_width(font, word) > max_width:
+            cut = max(1, _longest_fitting_prefix(word, font, max_width))
+            lines.append(word[:cut])
+            word = word[cut:]
+        current = word
+    if current:
+        lines.append(current)
+    return lines
+
+
+def truncate_text(text, font, max_width):
+    """Cut text to fit on one line, ending with an ellipsis"""
+    if text_width(font, text) <= max_width:
+        return text
+    return text[:_longest_fitting_prefix(text, font, max_width, ELLIPSIS)].rstrip() + ELLIPSIS
+
+
+def split_paragraphs(text):
+    """Split text on its line breaks (``\r\n``, ``\r`` or ``\n``) into paragraphs"""
+    return text.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+
+
+def fit_text(text, font, max_width, mode='wrap', font_for_size=None):
+    """Fit text into ``max_width``; returns the font to draw with and the lines.
+
+    ``mode`` is one of ``wrap``, ``truncate`` or ``shrink``. Line breaks in the
+    text are kept and each paragraph is fitted on its own, so the returned
+    lines are exactly the lines to draw. Shrinking needs
+    ``font_for_size(size)`` to load smaller variants of the font; text that
+    still does not fit at the minimum size is truncated.
+    """
+    paragraphs = split_paragraphs(text)
+    widest = max(paragraphs, key=lambda paragraph: text_width(font, paragraph))
+    if text_width(font, widest) <= max_width:
+        return font, paragraphs
+    if mode == 'wrap':
+        lines = []
+        for paragraph in paragraphs:
+            lines.extend(wrap_text(paragraph, font, max_width) or [''])
+        return font, lines
+    if mode == 'shrink' and font_for_size and getattr(font, 'size', None):
+        size = font.size
+        while size > MIN_FONT_SIZE and text_width(font, widest) > max_width:
+            size -= 1
+            font = font_for_size(size)
+            widest = max(paragraphs, key=lambda paragraph: text_width(font, paragraph))
+    return font, [truncate_text(paragraph, font, max_width) for paragraph in paragraphs]